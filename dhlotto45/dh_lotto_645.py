@@ -1,6 +1,8 @@
 import datetime
 import json
 import logging
+import time
+from collections import OrderedDict
 from dataclasses import dataclass, field
 from enum import StrEnum
 from typing import List, Dict, Optional
@@ -10,22 +12,29 @@ from dh_lottery_client import DhLotteryClient, DhLotteryError
 
 _LOGGER = logging.getLogger(__name__)
 
+_TZ_KST = datetime.timezone(datetime.timedelta(hours=9))
 
-def _rank_drawed_to_result(rank: int, drawed: bool) -> str:
-    """lotto645TicketDetail game_dtl[].rank + drawed → 결과 텍스트."""
-    if not drawed:
-        return "미추첨"
-    if rank == 1:
-        return "1등 당첨"
-    if rank == 2:
-        return "2등 당첨"
-    if rank == 3:
-        return "3등 당첨"
-    if rank == 4:
-        return "4등 당첨"
-    if rank == 5:
-        return "5등 당첨"
-    return "낙첨"
+# 회차 정보 캐시: 추첨 완료 회차는 바뀌지 않으므로 round_no 기준 LRU (analyzer가 최근 50회 조회)
+_ROUND_INFO_CACHE_SIZE = 64
+_round_info_cache: "OrderedDict[int, DhLotto645.WinningData]" = OrderedDict()
+# 최신 회차: (만료 timestamp, WinningData), 다음 추첨(토요일 20:45 KST)까지 유효
+_latest_round_cache: Optional[tuple] = None
+
+
+def _next_draw_timestamp(draw_date: Optional[str]) -> float:
+    """draw_date(YYYYMMDD) 다음 회차 추첨 시각(토요일 20:45 KST)의 timestamp."""
+    try:
+        drawn = datetime.datetime.strptime(str(draw_date), "%Y%m%d").replace(
+            hour=20, minute=45, tzinfo=_TZ_KST
+        )
+        return (drawn + datetime.timedelta(days=7)).timestamp()
+    except (TypeError, ValueError):
+        now = datetime.datetime.now(_TZ_KST)
+        next_draw = now.replace(hour=20, minute=45, second=0, microsecond=0)
+        next_draw += datetime.timedelta(days=(5 - now.weekday()) % 7)
+        if next_draw <= now:
+            next_draw += datetime.timedelta(days=7)
+        return next_draw.timestamp()
 
 
 class DhLotto645Error(DhLotteryError):
@@ -74,13 +83,15 @@ class DhLotto645SelMode(StrEnum):
 
     def __str__(self):
         """Convert lottery purchase mode to Korean string."""
-        if self == DhLotto645SelMode.AUTO:
-            return "자동"
-        if self == DhLotto645SelMode.MANUAL:
-            return "수동"
-        if self == DhLotto645SelMode.SEMI_AUTO:
-            return "반자동"
-        raise ValueError(f"Invalid value: {self}")
+        return _MODE_LABELS[self]
+
+
+# 구매 모드 → 한글 표시 (센서 속성에서 게임마다 호출되므로 조회 테이블 사용)
+_MODE_LABELS = {
+    DhLotto645SelMode.AUTO: "자동",
+    DhLotto645SelMode.MANUAL: "수동",
+    DhLotto645SelMode.SEMI_AUTO: "반자동",
+}
 
 
 class DhLotto645:
@@ -146,7 +157,17 @@ class DhLotto645:
         self.client = client
 
     async def async_get_round_info(self, round_no: Optional[int] = None) -> WinningData:
-        """Get specific round lottery information."""
+        """Get specific round lottery information (cached per round, latest until next draw)."""
+        global _latest_round_cache
+
+        if round_no:
+            cached = _round_info_cache.get(round_no)
+            if cached is not None:
+                _round_info_cache.move_to_end(round_no)
+                return cached
+        elif _latest_round_cache is not None and _latest_round_cache[0] > time.time():
+            return _latest_round_cache[1]
+
         params = {
             "_": int(datetime.datetime.now().timestamp() * 1000),
         }
@@ -159,7 +180,7 @@ class DhLotto645:
             raise DhLotto645Error(f"Failed to query round information. (round: {round_no})")
         item = items[0]
 
-        return DhLotto645.WinningData(
+        winning_data = DhLotto645.WinningData(
             round_no=item.get('ltEpsd'),
             numbers=[
                 item.get("tm1WnNo"),
@@ -173,6 +194,18 @@ class DhLotto645:
             draw_date=item.get("ltRflYmd"),
         )
 
+        if not round_no:
+            # 추첨 후 사이트 반영 전이면 만료 시각이 이미 지났으므로 캐시하지 않음
+            expires_at = _next_draw_timestamp(winning_data.draw_date)
+            if expires_at > time.time():
+                _latest_round_cache = (expires_at, winning_data)
+        if winning_data.round_no:
+            _round_info_cache[winning_data.round_no] = winning_data
+            _round_info_cache.move_to_end(winning_data.round_no)
+            while len(_round_info_cache) > _ROUND_INFO_CACHE_SIZE:
+                _round_info_cache.popitem(last=False)
+        return winning_data
+
     async def async_get_weekly_purchase_count(self) -> int:
         """이번 주 미추첨 구매 수량 반환 (주간 한도 확인용)."""
         _items = await self.client.async_get_buy_list('LO40')
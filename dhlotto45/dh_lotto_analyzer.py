@@ -11,6 +11,21 @@ from dh_lotto_645 import DhLotto645
 _LOGGER = logging.getLogger(__name__)
 
 
+def _match_rank(matching_count: int, bonus_match: bool) -> int:
+    """일치 개수 + 보너스 일치 여부로 등수 결정 (0 = 낙첨)"""
+    if matching_count == 6:
+        return 1
+    if matching_count == 5 and bonus_match:
+        return 2
+    if matching_count == 5:
+        return 3
+    if matching_count == 4:
+        return 4
+    if matching_count == 3:
+        return 5
+    return 0
+
+
 class DhLottoAnalyzerError(DhLotteryError):
     """로또 analysis 예외 클래스입니다."""
 
@@ -281,17 +296,7 @@ class DhLottoAnalyzer:
             bonus_match = winning_data.bonus_num in my_numbers
             
             # 등수 결정
-            rank = 0
-            if matching_count == 6:
-                rank = 1
-            elif matching_count == 5 and bonus_match:
-                rank = 2
-            elif matching_count == 5:
-                rank = 3
-            elif matching_count == 4:
-                rank = 4
-            elif matching_count == 3:
-                rank = 5
+            rank = _match_rank(matching_count, bonus_match)
             
             return {
                 "round_no": round_no,
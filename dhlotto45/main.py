@@ -9,10 +9,14 @@ import os
 import asyncio
 import logging
 import time
+from itertools import islice
 from typing import Optional, Dict, List
 from datetime import date, datetime, timezone, timedelta
 from contextlib import asynccontextmanager
 
+import aiohttp
+import orjson
+
 try:
     from zoneinfo import ZoneInfo
     _TZ_KST = ZoneInfo("Asia/Seoul")
@@ -24,7 +28,7 @@ from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 
 from dh_lottery_client import DhLotteryClient, DhLotteryError, DhLotteryLoginError
-from dh_lotto_645 import DhLotto645, DhLotto645SelMode, DhLotto645Error, _rank_drawed_to_result
+from dh_lotto_645 import DhLotto645, DhLotto645SelMode, DhLotto645Error
 from dh_lotto_analyzer import DhLottoAnalyzer
 from mqtt_discovery import MQTTDiscovery, publish_sensor_mqtt
 
@@ -49,6 +53,16 @@ class AccountData:
         self.update_task: Optional[asyncio.Task] = None
         # 구매 불가 시간대(토요일 20:00~일요일 06:00)에 이전 회차 당첨 결과 1회만 동기화
         self.prev_round_result_synced_when_unavailable: bool = False
+        # 고정값 센서(구매 가능 시간, 당첨 확률)는 MQTT retained 발행 성공 후 재발행하지 않음
+        self.purchase_time_published: bool = False
+        self.probabilities_published: bool = False
+        # entity_id -> (state/attributes hash, monotonic time) of last retained MQTT publish
+        self.last_published: Dict[str, tuple] = {}
+        # 이 계정의 버튼/센서를 발행한 MQTT 연결 generation (다르면 재연결 후 전체 재발행)
+        self.mqtt_generation: int = 0
+        # Hot/Cold 통계는 추첨 결과에만 의존 → 최신 회차가 바뀔 때까지 재조회하지 않음
+        self.hot_cold_round: Optional[int] = None
+        self.hot_cold_data = None
 
 # Configuration variables
 config = {
@@ -61,11 +75,115 @@ config = {
     "is_beta": os.getenv("IS_BETA", "false").lower() == "true",
 }
 
+# 변경 없는 센서도 이 주기(초)마다 한 번은 재발행 (retained 메시지 유실 대비)
+_FORCE_REPUBLISH_SECONDS = 6 * 3600
+_DIGEST_JSON_OPTIONS = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+# 동시에 로그인/동기화하는 계정 수 상한 (동행복권 사이트 부하 제한)
+_PARALLEL_ACCOUNTS = 4
+# REST fallback 전송 워커 수 (워커마다 전용 큐)
+_REST_WORKERS = 4
+
+# Static sensor payloads (entity_id, state, attributes)
+_PURCHASE_TIME_PAYLOAD = ("lotto45_purchase_available_time",
+    "weekdays: 06:00-24:00, saturday: 06:00-20:00, sunday: 06:00-24:00", {
+    "weekdays": "06:00-24:00",
+    "saturday": "06:00-20:00",
+    "sunday": "06:00-24:00",
+    "friendly_name": "구매 가능 시간",
+    "icon": "mdi:clock-time-eight",
+})
+
+
+def _build_probability_payloads() -> List[tuple]:
+    """당첨 확률 센서 payload (조합 수 기반 고정값)"""
+    # Total combinations: C(45, 6) = 8,145,060
+    total_combinations = 8145060
+    payloads = []
+    for rank, winning_combinations, fraction, digits, icon in [
+        (1, 1, "1/8,145,060", 7, "mdi:trophy"),                 # 6 numbers match
+        (2, 6, "6/8,145,060", 7, "mdi:medal"),                  # 5 numbers + bonus
+        (3, 234, "234/8,145,060", 5, "mdi:medal-outline"),      # 5 numbers
+        (4, 11115, "11,115/8,145,060", 4, "mdi:currency-krw"),  # 4 numbers
+        (5, 185220, "185,220/8,145,060", 3, "mdi:cash"),        # 3 numbers
+    ]:
+        probability = (winning_combinations / total_combinations) * 100
+        payloads.append((f"lotto645_probability_rank{rank}", f"{probability:.{digits}f}", {
+            "probability_decimal": probability,
+            "probability_fraction": fraction,
+            "unit_of_measurement": "%",
+            "friendly_name": f"로또 {rank}등 당첨 확률",
+            "icon": icon,
+        }))
+    return payloads
+
+
+_PROBABILITY_PAYLOADS = _build_probability_payloads()
+
+# Icons / empty game payloads (read-only, 매 주기마다 dict/f-string 재생성 방지)
+_NUMBER_ICON = [f"mdi:numeric-{i}-circle" for i in range(1, 7)]
+_BOX_OUTLINE_ICON = [f"mdi:numeric-{i}-box-outline" for i in range(1, 6)]
+_BOX_MULTIPLE_ICON = [f"mdi:numeric-{i}-box-multiple" for i in range(1, 6)]
+_PRIZE_ENTITY_IDS = [f"lotto645_{name}_prize" for name in ("first", "second", "third", "fourth", "fifth")]
+_PRIZE_ICON = ["mdi:trophy", "mdi:medal", "mdi:medal-outline", "mdi:currency-krw", "mdi:cash"]
+_FREQ_FMT = "{}번({}번 출현)".format
+
+
+def _build_empty_game_payloads(entity_prefix: str, label: str) -> List[tuple]:
+    """구매 내역 없는 슬롯의 (게임, 결과) 센서 payload 쌍 (슬롯 1~5)"""
+    payloads = []
+    for i in range(1, 6):
+        payloads.append((
+            (f"{entity_prefix}{i}", "구매 내역 없음", {
+                "slot": "-", "슬롯": "-", "mode": "-", "선택": "-",
+                "numbers": [], "round_no": 0, "result": "-",
+                "friendly_name": f"구매 게임 {i} ({label})", "icon": _BOX_OUTLINE_ICON[i - 1],
+            }),
+            (f"{entity_prefix}{i}_result", "구매 내역 없음", {
+                "round_no": 0, "my_numbers": [], "winning_numbers": [], "bonus_number": 0,
+                "matching_count": 0, "bonus_match": False, "rank": 0, "result": "구매 내역 없음", "color": "grey",
+                "friendly_name": f"구매 게임 {i} ({label}) 결과", "icon": "mdi:circle-outline",
+            }),
+        ))
+    return payloads
+
+
+def _game_attrs(i: int, label: str, game_info: dict) -> dict:
+    """구매 게임 슬롯 센서 attributes (game_info: _iter_games 항목)"""
+    game = game_info["game"]
+    mode_s = str(game.mode)
+    return {
+        "slot": game.slot, "슬롯": game.slot, "mode": mode_s, "선택": mode_s,
+        "numbers": game.numbers, "round_no": game_info["round_no"], "result": game_info["meta"][0],
+        "friendly_name": f"구매 게임 {i} ({label})", "icon": _BOX_MULTIPLE_ICON[i - 1],
+    }
+
+
+def _game_result_attrs(i: int, label: str, game_info: dict, winning_numbers: list, bonus_number: int) -> dict:
+    """구매 게임 결과 센서 attributes"""
+    result, icon, color = game_info["meta"]
+    return {
+        "round_no": game_info["round_no"], "my_numbers": game_info["game"].numbers,
+        "winning_numbers": winning_numbers, "bonus_number": bonus_number,
+        "result": result, "color": color,
+        "friendly_name": f"구매 게임 {i} ({label}) 결과", "icon": icon,
+    }
+
+
+_EMPTY_CURRENT_GAME_PAYLOADS = _build_empty_game_payloads("lotto45_game_", "현재")
+_EMPTY_PREV_GAME_PAYLOADS = _build_empty_game_payloads("lotto45_prev_game_", "이전")
+
 # Global variables
 accounts: Dict[str, AccountData] = {}
 _last_purchase_time: Dict[tuple, float] = {}  # (username, button_id) -> timestamp, 중복 실행 방지
 mqtt_client: Optional[MQTTDiscovery] = None
 event_loop: Optional[asyncio.AbstractEventLoop] = None
+_rest_session: Optional[aiohttp.ClientSession] = None  # get_rest_session()에서 지연 생성
+_rest_session_lock = asyncio.Lock()
+# REST fallback 요청은 큐에 넣고 워커가 전송 (센서 업데이트 루프가 Supervisor 응답을 기다리지 않음)
+# 워커마다 전용 큐: 같은 엔티티(url)는 항상 같은 큐로 가므로 발행 순서가 유지됨
+_rest_queues: List[asyncio.Queue] = [asyncio.Queue() for _ in range(_REST_WORKERS)]  # (username, url, body)
+# 여러 계정의 로그인/동기화를 동시에 진행하되 동행복권 사이트 부하 제한
+_account_semaphore = asyncio.Semaphore(_PARALLEL_ACCOUNTS)
 
 
 def load_accounts_from_env():
@@ -131,13 +249,15 @@ def _get_lotto645_item(data: dict) -> dict:
     return data
 
 
-def is_purchase_available_now() -> bool:
+def is_purchase_available_now(now: Optional[datetime] = None) -> bool:
     """
     동행복권 구매 가능 시간(KST)이면 True.
     - 평일/일: 06:00~24:00 (구매 불가: 00:00~05:59)
     - 토요일: 06:00~20:00 (구매 불가: 20:00~06:00 = 20:00~23:59 + 00:00~05:59)
+    now: 기준 시각 (KST, 생략 시 현재 시각)
     """
-    now = datetime.now(_TZ_KST)
+    if now is None:
+        now = datetime.now(_TZ_KST)
     wd = now.weekday()  # 0=Mon .. 6=Sun
     minutes = now.hour * 60 + now.minute  # 06:00 = 360, 20:00 = 1200
     if minutes < 360:  # 00:00~05:59 모든 요일 구매 불가
@@ -148,12 +268,14 @@ def is_purchase_available_now() -> bool:
     return True
 
 
-def get_next_available_time() -> datetime:
+def get_next_available_time(now: Optional[datetime] = None) -> datetime:
     """
     다음 구매 가능 시간을 계산합니다.
+    now: 기준 시각 (KST, 생략 시 현재 시각)
     Returns: 다음 구매 가능 시간 (KST)
     """
-    now = datetime.now(_TZ_KST)
+    if now is None:
+        now = datetime.now(_TZ_KST)
     wd = now.weekday()  # 0=Mon .. 6=Sun
     minutes = now.hour * 60 + now.minute
     
@@ -185,7 +307,7 @@ async def register_buttons_for_account(account: AccountData):
     device_name = f"DH Lottery Addon{device_suffix} ({username})"
     device_id = f"dhlotto_addon_{username}"
     
-    # Buttons
+    # Buttons / Input Text: PUBACK을 기다리지 않고 paho 발행 큐에 넣음 (retained, QoS 1)
     for button_id, button_name, icon in [
         ("buy_auto_1", "1 게임 자동 구매", "mdi:ticket-confirmation"),
         ("buy_auto_5", "5 게임 자동 구매", "mdi:ticket-confirmation-outline"),
@@ -201,9 +323,9 @@ async def register_buttons_for_account(account: AccountData):
             device_name=device_name,
             device_identifier=device_id,
             icon=icon,
+            wait=False,
         )
     
-    # Input Text
     input_state_topic = f"homeassistant/text/{mqtt_client.topic_prefix}_{username}_manual_numbers/state"
     input_command_topic = f"homeassistant/text/{mqtt_client.topic_prefix}_{username}_manual_numbers/set"
     
@@ -217,12 +339,28 @@ async def register_buttons_for_account(account: AccountData):
         device_identifier=device_id,
         icon="mdi:numeric",
         mode="text",
+        wait=False,
     )
     
-    mqtt_client.client.publish(input_state_topic, "auto,auto,auto,auto,auto,auto", qos=1, retain=True)
+    mqtt_client.client.publish(input_state_topic, account.manual_numbers_state, qos=1, retain=True)
+    account.mqtt_generation = mqtt_client.generation
     logger.info(f"[BUTTON][{username}] All buttons registered")
 
 
+async def _resync_after_reconnect(account: AccountData):
+    """MQTT 재연결 후(브로커 재시작 시 retained 유실 가능) 발행 기록을 버리고 버튼/센서를 다시 발행"""
+    if account.mqtt_generation == mqtt_client.generation:
+        return
+    was_registered = account.mqtt_generation != 0
+    account.mqtt_generation = mqtt_client.generation
+    account.last_published.clear()
+    account.purchase_time_published = False
+    account.probabilities_published = False
+    if was_registered:
+        logger.info(f"[MQTT][{account.username}] Reconnected, republishing entities")
+        await register_buttons_for_account(account)
+
+
 def on_button_command(client_mqtt, userdata, message):
     """Handle MQTT button commands"""
     try:
@@ -439,7 +577,6 @@ async def init_clients():
         logger.error("No accounts configured")
         return False
     
-    success_count = 0
     for acc_config in config["accounts"]:
         username = acc_config.get("username", "")
         password = acc_config.get("password", "")
@@ -448,11 +585,17 @@ async def init_clients():
         if not username or not password:
             continue
         
-        account = AccountData(username, password, enabled)
-        accounts[username] = account
-        
-        if await init_account(account):
-            success_count += 1
+        accounts[username] = AccountData(username, password, enabled)
+    
+    async def _init_with_limit(account: AccountData) -> bool:
+        async with _account_semaphore:
+            return await init_account(account)
+    
+    results = await asyncio.gather(
+        *(_init_with_limit(account) for account in accounts.values()),
+        return_exceptions=True,
+    )
+    success_count = sum(1 for result in results if result is True)
     
     logger.info(f"Initialized {success_count}/{len(accounts)} account(s)")
     
@@ -471,6 +614,13 @@ async def init_clients():
         if mqtt_client.connect():
             logger.info("MQTT connected")
             
+            # 첫 bulk state 발행 전에 브로커의 retained 값을 불러와 아직 갱신하지 않은 센서를 보존
+            restored = await asyncio.to_thread(
+                mqtt_client.restore_bulk_states,
+                [account.username for account in accounts.values() if account.enabled],
+            )
+            logger.info(f"[MQTT] Restored {restored} retained sensor state(s)")
+            
             # Only register buttons for successfully logged in accounts
             for account in accounts.values():
                 if account.enabled and config["enable_lotto645"] and account.client and account.client.logged_in:
@@ -483,23 +633,25 @@ async def init_clients():
                 # Set callback once
                 mqtt_client.client.on_message = on_button_command
                 
-                # Subscribe to each account's buttons
+                # Subscribe to each account's buttons / input_text: 전체 토픽을 SUBSCRIBE 1회로 구독
+                button_ids = ["buy_auto_1", "buy_auto_5", "buy_manual", "generate_random"]
+                topics = []
+                subscribed_accounts = 0
                 for account in accounts.values():
                     if account.enabled and account.client and account.client.logged_in:
-                        button_ids = ["buy_auto_1", "buy_auto_5", "buy_manual", "generate_random"]
-                        
-                        # Subscribe to button commands
-                        for button_id in button_ids:
-                            command_topic = f"homeassistant/button/{mqtt_client.topic_prefix}_{account.username}_{button_id}/command"
-                            mqtt_client.client.subscribe(command_topic)
-                            logger.info(f"[MQTT] Subscribed: {command_topic}")
-                        
-                        # Subscribe to input_text
-                        input_command_topic = f"homeassistant/text/{mqtt_client.topic_prefix}_{account.username}_manual_numbers/set"
-                        mqtt_client.client.subscribe(input_command_topic)
-                        logger.info(f"[MQTT] Subscribed: {input_command_topic}")
+                        subscribed_accounts += 1
+                        topics.extend(
+                            (f"homeassistant/button/{mqtt_client.topic_prefix}_{account.username}_{button_id}/command", 0)
+                            for button_id in button_ids
+                        )
+                        topics.append((f"homeassistant/text/{mqtt_client.topic_prefix}_{account.username}_manual_numbers/set", 0))
                 
-                logger.info(f"[MQTT] Subscribed to {len([a for a in accounts.values() if a.enabled and a.client and a.client.logged_in])} account(s)")
+                if topics:
+                    mqtt_client.subscribe(topics)
+                    for topic, _ in topics:
+                        logger.info(f"[MQTT] Subscribed: {topic}")
+                
+                logger.info(f"[MQTT] Subscribed to {subscribed_accounts} account(s)")
         else:
             logger.warning("MQTT connection failed")
             mqtt_client = None
@@ -523,6 +675,11 @@ async def cleanup_clients():
                 await account.client.close()
             except:
                 pass
+    
+    try:
+        await close_rest_session()
+    except:
+        pass
 
 
 @asynccontextmanager
@@ -535,6 +692,8 @@ async def lifespan(app: FastAPI):
     event_loop = asyncio.get_running_loop()
     await init_clients()
     
+    rest_workers = [asyncio.create_task(_rest_worker(queue)) for queue in _rest_queues]
+    
     tasks = []
     for account in accounts.values():
         if account.enabled:
@@ -550,6 +709,9 @@ async def lifespan(app: FastAPI):
     for task in tasks:
         task.cancel()
     await asyncio.gather(*tasks, return_exceptions=True)
+    for worker in rest_workers:
+        worker.cancel()
+    await asyncio.gather(*rest_workers, return_exceptions=True)
     await cleanup_clients()
 
 
@@ -593,7 +755,8 @@ async def background_tasks_for_account(account: AccountData):
                 # 구매 불가 시간대: 이전 회차 당첨 결과 1회만 동기화 (추첨 후 바로 확인용)
                 if not account.prev_round_result_synced_when_unavailable:
                     try:
-                        await update_prev_round_result_sensors_for_account(account)
+                        async with _account_semaphore:
+                            await update_prev_round_result_sensors_for_account(account)
                         account.prev_round_result_synced_when_unavailable = True
                         logger.info(f"[BG][{username}] Prev-round result sync done (once per unavailable period)")
                     except Exception as e:
@@ -606,7 +769,8 @@ async def background_tasks_for_account(account: AccountData):
             if not was_purchase_available:
                 account.prev_round_result_synced_when_unavailable = False
             was_purchase_available = True
-            await update_sensors_for_account(account)
+            async with _account_semaphore:
+                await update_sensors_for_account(account)
             await asyncio.sleep(config["update_interval"])
         except asyncio.CancelledError:
             break
@@ -615,24 +779,36 @@ async def background_tasks_for_account(account: AccountData):
             await asyncio.sleep(60)
 
 
-def _ltwn_result_to_icon_color(ltwn_result: str) -> tuple[str, str]:
-    """selectMyLotteryledger API의 ltWnResult를 아이콘/색상으로 매핑."""
-    if not ltwn_result:
-        return "mdi:circle-outline", "grey"
-    r = ltwn_result.strip()
-    if "1등" in r:
-        return "mdi:trophy", "gold"
-    if "2등" in r:
-        return "mdi:medal", "silver"
-    if "3등" in r:
-        return "mdi:medal-outline", "bronze"
-    if "4등" in r:
-        return "mdi:currency-krw", "blue"
-    if "5등" in r:
-        return "mdi:cash", "green"
-    if "낙첨" in r:
-        return "mdi:close-circle-outline", "red"
-    return "mdi:clock-outline", "grey"
+# 당첨 등수(rank) → (결과, 아이콘, 색상). index 0 = 낙첨
+_RANK_META = (
+    ("낙첨", "mdi:close-circle-outline", "red"),
+    ("1등 당첨", "mdi:trophy", "gold"),
+    ("2등 당첨", "mdi:medal", "silver"),
+    ("3등 당첨", "mdi:medal-outline", "bronze"),
+    ("4등 당첨", "mdi:currency-krw", "blue"),
+    ("5등 당첨", "mdi:cash", "green"),
+)
+_UNDRAWN_META = ("미추첨", "mdi:clock-outline", "grey")
+
+
+def _rank_meta(rank: int, drawed: bool) -> tuple[str, str, str]:
+    """lotto645TicketDetail game_dtl[].rank + drawed → (결과 텍스트, 아이콘, 색상)."""
+    if not drawed:
+        return _UNDRAWN_META
+    return _RANK_META[rank] if rank in range(1, 6) else _RANK_META[0]
+
+
+def _iter_games(history, round_no: Optional[int] = None):
+    """구매내역의 게임을 순서대로 생성 (round_no 지정 시 해당 회차만). islice로 최대 개수 제한."""
+    for purchase in history:
+        if round_no is not None and purchase.round_no != round_no:
+            continue
+        for gd in purchase.game_details:
+            yield {
+                "game": gd["game"],
+                "round_no": purchase.round_no,
+                "meta": _rank_meta(gd["rank"], gd["drawed"]),
+            }
 
 
 async def update_prev_round_result_sensors_for_account(account: AccountData):
@@ -655,88 +831,36 @@ async def update_prev_round_result_sensors_for_account(account: AccountData):
             return
 
     try:
+        pending: List[tuple] = []
         prev_round_no, history = await account.lotto_645.async_get_prev_drawn_round_and_history()
         if prev_round_no == 0 or not history:
-            await publish_sensor_for_account(account, "lotto45_prev_round", 0, {
+            pending.append(("lotto45_prev_round", 0, {
                 "friendly_name": "구매 회차 (이전)",
                 "icon": "mdi:counter",
-            })
+            }))
             for i in range(1, 6):
-                await publish_sensor_for_account(account, f"lotto45_prev_game_{i}", "구매 내역 없음", {
-                    "slot": "-", "슬롯": "-", "mode": "-", "선택": "-",
-                    "numbers": [], "round_no": 0, "result": "-",
-                    "friendly_name": f"구매 게임 {i} (이전)", "icon": f"mdi:numeric-{i}-box-outline",
-                })
-                await publish_sensor_for_account(account, f"lotto45_prev_game_{i}_result", "구매 내역 없음", {
-                    "round_no": 0, "my_numbers": [], "winning_numbers": [], "bonus_number": 0,
-                    "matching_count": 0, "bonus_match": False, "rank": 0, "result": "구매 내역 없음", "color": "grey",
-                    "friendly_name": f"구매 게임 {i} (이전) 결과", "icon": "mdi:circle-outline",
-                })
+                pending.extend(_EMPTY_PREV_GAME_PAYLOADS[i - 1])
+            await _flush_sensors(account, pending)
             return
 
-        await publish_sensor_for_account(account, "lotto45_prev_round", prev_round_no, {
+        pending.append(("lotto45_prev_round", prev_round_no, {
             "friendly_name": "구매 회차 (이전)",
             "icon": "mdi:counter",
-        })
+        }))
 
-        all_games: list[dict] = []
-        for purchase in history:
-            for gd in purchase.game_details:
-                all_games.append({
-                    "game": gd["game"],
-                    "round_no": purchase.round_no,
-                    "result": _rank_drawed_to_result(gd["rank"], gd["drawed"]),
-                })
-                if len(all_games) >= 5:
-                    break
-            if len(all_games) >= 5:
-                break
+        all_games = list(islice(_iter_games(history), 5))
 
         winning_data = await account.lotto_645.async_get_round_info(prev_round_no)
 
-        for i in range(1, 6):
-            if i <= len(all_games):
-                game_info = all_games[i - 1]
-                game = game_info["game"]
-                round_no = game_info["round_no"]
-                ltwn_result = game_info["result"] or "낙첨"
-                numbers_str = ", ".join(map(str, game.numbers))
-                result_icon, result_color = _ltwn_result_to_icon_color(ltwn_result)
-
-                await publish_sensor_for_account(account, f"lotto45_prev_game_{i}", numbers_str, {
-                    "slot": game.slot,
-                    "슬롯": game.slot,
-                    "mode": str(game.mode),
-                    "선택": str(game.mode),
-                    "numbers": game.numbers,
-                    "round_no": round_no,
-                    "result": ltwn_result,
-                    "friendly_name": f"구매 게임 {i} (이전)",
-                    "icon": f"mdi:numeric-{i}-box-multiple",
-                })
-                await publish_sensor_for_account(account, f"lotto45_prev_game_{i}_result", ltwn_result, {
-                    "round_no": round_no,
-                    "my_numbers": game.numbers,
-                    "winning_numbers": winning_data.numbers,
-                    "bonus_number": winning_data.bonus_num,
-                    "result": ltwn_result,
-                    "color": result_color,
-                    "friendly_name": f"구매 게임 {i} (이전) 결과",
-                    "icon": result_icon,
-                })
-            else:
-                await publish_sensor_for_account(account, f"lotto45_prev_game_{i}", "구매 내역 없음", {
-                    "slot": "-", "슬롯": "-", "mode": "-", "선택": "-",
-                    "numbers": [], "round_no": 0, "result": "-",
-                    "friendly_name": f"구매 게임 {i} (이전)",
-                    "icon": f"mdi:numeric-{i}-box-outline",
-                })
-                await publish_sensor_for_account(account, f"lotto45_prev_game_{i}_result", "구매 내역 없음", {
-                    "round_no": 0, "my_numbers": [], "winning_numbers": [], "bonus_number": 0,
-                    "matching_count": 0, "bonus_match": False, "rank": 0, "result": "구매 내역 없음", "color": "grey",
-                    "friendly_name": f"구매 게임 {i} (이전) 결과",
-                    "icon": "mdi:circle-outline",
-                })
+        for i, game_info in enumerate(all_games, 1):
+            numbers_str = ", ".join(map(str, game_info["game"].numbers))
+            pending.append((f"lotto45_prev_game_{i}", numbers_str, _game_attrs(i, "이전", game_info)))
+            pending.append((f"lotto45_prev_game_{i}_result", game_info["meta"][0], _game_result_attrs(
+                i, "이전", game_info, winning_data.numbers, winning_data.bonus_num)))
+        for i in range(len(all_games) + 1, 6):
+            pending.extend(_EMPTY_PREV_GAME_PAYLOADS[i - 1])
+
+        await _flush_sensors(account, pending)
 
         logger.info(f"[PREV_ROUND][{username}] Prev-round sensors updated (round {prev_round_no}, games: {len(all_games)})")
     except Exception as e:
@@ -747,10 +871,16 @@ async def update_sensors_for_account(account: AccountData):
     """Update all sensors for account. 구매 불가 시간대에는 로그인/API 호출 없이 스킵."""
     username = account.username
 
+    # 현재 시각은 주기당 1회만 계산해 오류/성공 센서에서 공통 사용
+    utc_now = datetime.now(timezone.utc)
+    now_kst = utc_now.astimezone(_TZ_KST)
+    utc_iso = utc_now.isoformat()
+    kst_str = now_kst.strftime("%Y-%m-%d %H:%M:%S")
+    retry_in = f"{config['update_interval'] // 60}분 후"
+
     # 구매 불가 시간대 체크 (최우선)
-    if not is_purchase_available_now():
-        now_kst = datetime.now(_TZ_KST)
-        next_available = get_next_available_time()
+    if not is_purchase_available_now(now_kst):
+        next_available = get_next_available_time(now_kst)
         time_until_available = next_available - now_kst
         hours = int(time_until_available.total_seconds() // 3600)
         minutes = int((time_until_available.total_seconds() % 3600) // 60)
@@ -761,7 +891,7 @@ async def update_sensors_for_account(account: AccountData):
         await publish_sensor_for_account(account, "lotto45_sync_status", "구매 불가 시간 (동기화 대기 중)", {
             "status": "waiting",
             "reason": "구매 불가능 시간대",
-            "current_time_kst": now_kst.strftime("%Y-%m-%d %H:%M:%S"),
+            "current_time_kst": kst_str,
             "next_available_time": next_available.strftime("%Y-%m-%d %H:%M:%S"),
             "time_until_available": f"{hours}시간 {minutes}분 후",
             "available_hours": {
@@ -781,14 +911,13 @@ async def update_sensors_for_account(account: AccountData):
             await account.client.async_login()
             logger.info(f"[SENSOR][{username}] Re-login successful")
         except Exception as e:
-            now_kst = datetime.now(_TZ_KST)
             msg = str(e)[:255]
             logger.error(f"[SENSOR][{username}] Login failed: {e}")
             
             # 로그인 오류 센서
             await publish_sensor_for_account(account, "lotto45_login_error", msg, {
                 "error": str(e),
-                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "timestamp": utc_iso,
                 "friendly_name": "로그인 오류",
                 "icon": "mdi:account-alert",
             })
@@ -797,22 +926,23 @@ async def update_sensors_for_account(account: AccountData):
             await publish_sensor_for_account(account, "lotto45_sync_status", "동기화 실패 (재로그인 필요)", {
                 "status": "relogin_failed",
                 "error": msg,
-                "error_time": now_kst.strftime("%Y-%m-%d %H:%M:%S"),
-                "retry_in": f"{config['update_interval'] // 60}분 후",
+                "error_time": kst_str,
+                "retry_in": retry_in,
                 "action_required": "애드온 재시작 또는 계정 정보 확인 필요",
                 "friendly_name": "동기화 상태",
                 "icon": "mdi:login-variant",
-            })
+            }, qos=1)
             
             logger.warning(f"[SENSOR][{username}] Skipping sensor update due to login failure")
             return
     
     try:
         logger.info(f"[SENSOR][{username}] Updating sensors...")
+        pending: List[tuple] = []  # (entity_id, state, attributes), _flush_sensors()로 일괄 발행
         
         # Balance
         balance = await account.client.async_get_balance()
-        await publish_sensor_for_account(account, "lotto45_balance", balance.deposit, {
+        pending.append(("lotto45_balance", balance.deposit, {
             "purchase_available": balance.purchase_available,
             "reservation_purchase": balance.reservation_purchase,
             "withdrawal_request": balance.withdrawal_request,
@@ -820,19 +950,15 @@ async def update_sensors_for_account(account: AccountData):
             "unit_of_measurement": "KRW",
             "friendly_name": "예치금",
             "icon": "mdi:wallet",
-        })
+        }))
+        await _flush_sensors(account, pending)
         
-        # Purchase time info
-        await publish_sensor_for_account(account, "lotto45_purchase_available_time",
-            "weekdays: 06:00-24:00, saturday: 06:00-20:00, sunday: 06:00-24:00", {
-            "weekdays": "06:00-24:00",
-            "saturday": "06:00-20:00",
-            "sunday": "06:00-24:00",
-            "friendly_name": "구매 가능 시간",
-            "icon": "mdi:clock-time-eight",
-        })
+        # Purchase time info (고정값)
+        if not account.purchase_time_published:
+            account.purchase_time_published = await _flush_sensors(account, [_PURCHASE_TIME_PAYLOAD])
         
         # Lotto stats
+        latest_round_info = None  # 최신 회차 정보: 구매내역/이전 회차 센서에서 재사용
         if config["enable_lotto645"] and account.analyzer:
             try:
                 # Get raw prize data
@@ -860,24 +986,24 @@ async def update_sensors_for_account(account: AccountData):
                 }
                 
                 # Round number
-                await publish_sensor_for_account(account, "lotto645_round", _safe_int(result_item.get("ltEpsd")), {
+                pending.append(("lotto645_round", _safe_int(result_item.get("ltEpsd")), {
                     "friendly_name": "로또 회차",
                     "icon": "mdi:counter",
-                })
+                }))
                 
                 # Individual numbers
                 for i in range(1, 7):
-                    await publish_sensor_for_account(account, f"lotto645_number{i}",
+                    pending.append((f"lotto645_number{i}",
                         _safe_int(result_item.get(f"tm{i}WnNo")), {
                         "friendly_name": f"로또 번호 {i}",
-                        "icon": f"mdi:numeric-{i}-circle",
-                    })
+                        "icon": _NUMBER_ICON[i - 1],
+                    }))
                 
                 # Bonus
-                await publish_sensor_for_account(account, "lotto645_bonus", _safe_int(result_item.get("bnsWnNo")), {
+                pending.append(("lotto645_bonus", _safe_int(result_item.get("bnsWnNo")), {
                     "friendly_name": "로또 보너스 번호",
                     "icon": "mdi:star-circle",
-                })
+                }))
                 
                 # Combined winning numbers
                 winning_numbers = [_safe_int(result_item.get(f"tm{i}WnNo")) for i in range(1, 7)]
@@ -885,49 +1011,53 @@ async def update_sensors_for_account(account: AccountData):
                 round_no = _safe_int(result_item.get("ltEpsd"))
                 winning_text = f"Round {round_no}: {', '.join(map(str, winning_numbers))} + {bonus_number}"
                 
-                await publish_sensor_for_account(account, "lotto645_winning_numbers", winning_text, {
+                pending.append(("lotto645_winning_numbers", winning_text, {
                     "numbers": winning_numbers,
                     "bonus": bonus_number,
                     "round": round_no,
                     "friendly_name": "당첨 번호",
                     "icon": "mdi:trophy-award",
-                })
+                }))
                 
                 # Draw date
                 draw_date = _parse_yyyymmdd(result_item.get("ltRflYmd"))
                 if draw_date:
-                    await publish_sensor_for_account(account, "lotto645_draw_date", draw_date, {
+                    pending.append(("lotto645_draw_date", draw_date, {
                         "friendly_name": "로또 추첨일",
                         "icon": "mdi:calendar",
                         "device_class": "date",
-                    })
+                    }))
                 
                 # Prize details
-                await publish_sensor_for_account(account, "lotto645_total_sales",
+                pending.append(("lotto645_total_sales",
                     _safe_int(item.get("wholEpsdSumNtslAmt")), {
                     "friendly_name": "총 판매액",
                     "unit_of_measurement": "KRW",
                     "icon": "mdi:cash-multiple",
-                })
+                }))
                 
                 # 1st-5th prizes
                 for rank in range(1, 6):
-                    await publish_sensor_for_account(account, f"lotto645_{['first','second','third','fourth','fifth'][rank-1]}_prize",
+                    pending.append((_PRIZE_ENTITY_IDS[rank - 1],
                         _safe_int(item.get(f"rnk{rank}WnAmt")), {
                         "friendly_name": f"로또 {rank}등 당첨금",
                         "unit_of_measurement": "KRW",
                         "total_amount": _safe_int(item.get(f"rnk{rank}SumWnAmt")),
                         "winners": _safe_int(item.get(f"rnk{rank}WnNope")),
-                        "icon": ["mdi:trophy", "mdi:medal", "mdi:medal-outline", "mdi:currency-krw", "mdi:cash"][rank-1],
-                    })
+                        "icon": _PRIZE_ICON[rank - 1],
+                    }))
                 
             except Exception as e:
                 logger.warning(f"[SENSOR][{username}] Failed to fetch lotto results: {e}")
+            await _flush_sensors(account, pending)
             
             # Purchase history - GAME SENSORS HERE!
             try:
                 history = await account.lotto_645.async_get_buy_history_this_week()
-                latest_round_no = await account.lotto_645.async_get_latest_round_no()
+                if latest_round_info is not None:
+                    latest_round_no = latest_round_info.round_no
+                else:
+                    latest_round_no = await account.lotto_645.async_get_latest_round_no()
                 current_round = latest_round_no + 1  # 아직 추첨 안 된 회차 = 현재 판매 중
                 
                 # Collect games (max 5) - 현재 회차(current_round) 구매만 표시
@@ -941,7 +1071,7 @@ async def update_sensors_for_account(account: AccountData):
                         "numbers": g.numbers
                     } for g in latest_purchase.games]
                     
-                    await publish_sensor_for_account(account, "lotto45_latest_purchase", latest_purchase.round_no, {
+                    pending.append(("lotto45_latest_purchase", latest_purchase.round_no, {
                         "round_no": latest_purchase.round_no,
                         "barcode": latest_purchase.barcode,
                         "result": latest_purchase.result,
@@ -949,22 +1079,10 @@ async def update_sensors_for_account(account: AccountData):
                         "games_count": len(latest_purchase.games),
                         "friendly_name": "로또 최근 구매 회차",
                         "icon": "mdi:receipt-text",
-                    })
+                    }))
                     
                     # 현재 회차 구매만 필터: round_no == current_round (이전 회차는 prev_game에 표시)
-                    for purchase in history:
-                        if purchase.round_no != current_round:
-                            continue
-                        for gd in purchase.game_details:
-                            all_games.append({
-                                'game': gd['game'],
-                                'round_no': purchase.round_no,
-                                'result': _rank_drawed_to_result(gd['rank'], gd['drawed']),
-                            })
-                            if len(all_games) >= 5:
-                                break
-                        if len(all_games) >= 5:
-                            break
+                    all_games = list(islice(_iter_games(history, current_round), 5))
                 else:
                     # No purchase history
                     logger.info(f"[SENSOR][{username}] No purchase history in the last week")
@@ -973,144 +1091,43 @@ async def update_sensors_for_account(account: AccountData):
                 weekly_purchase_count = 0
                 
                 # 구매 게임 (현재): 최근 5게임 구매내역 및 결과 표시
-                for i in range(1, 6):
-                    if i <= len(all_games):
-                        game_info = all_games[i - 1]
-                        game = game_info["game"]
-                        round_no = game_info["round_no"]
-                        numbers_str = ", ".join(map(str, game.numbers))
-                        await publish_sensor_for_account(account, f"lotto45_game_{i}", numbers_str, {
-                            "slot": game.slot,
-                            "슬롯": game.slot,
-                            "mode": str(game.mode),
-                            "선택": str(game.mode),
-                            "numbers": game.numbers,
-                            "round_no": round_no,
-                            "result": game_info["result"],
-                            "friendly_name": f"구매 게임 {i} (현재)",
-                            "icon": f"mdi:numeric-{i}-box-multiple",
-                        })
-                        try:
-                            ltwn_result = game_info["result"] or "미추첨"
-                            if round_no > latest_round_no:
-                                weekly_purchase_count += 1
-                            result_icon, result_color = _ltwn_result_to_icon_color(ltwn_result)
-                            winning_numbers_check = []
-                            bonus_number_check = 0
-                            if round_no <= latest_round_no:
-                                winning_data = await account.lotto_645.async_get_round_info(round_no)
-                                winning_numbers_check = winning_data.numbers
-                                bonus_number_check = winning_data.bonus_num
-                            await publish_sensor_for_account(account, f"lotto45_game_{i}_result", ltwn_result, {
-                                "round_no": round_no,
-                                "my_numbers": game.numbers,
-                                "winning_numbers": winning_numbers_check,
-                                "bonus_number": bonus_number_check,
-                                "result": ltwn_result,
-                                "color": result_color,
-                                "friendly_name": f"구매 게임 {i} (현재) 결과",
-                                "icon": result_icon,
-                            })
-                        except Exception as e:
-                            logger.warning(f"[SENSOR][{username}] Failed to check game {i}: {e}")
-                            await publish_sensor_for_account(account, f"lotto45_game_{i}_result", "Check Failed", {
-                                "round_no": round_no,
-                                "my_numbers": game.numbers,
-                                "error": str(e),
-                                "friendly_name": f"구매 게임 {i} (현재) 결과",
-                                "icon": "mdi:alert-circle-outline",
-                            })
-                    else:
-                        await publish_sensor_for_account(account, f"lotto45_game_{i}", "구매 내역 없음", {
-                            "slot": "-",
-                            "슬롯": "-",
-                            "mode": "-",
-                            "선택": "-",
-                            "numbers": [],
-                            "round_no": 0,
-                            "result": "-",
-                            "friendly_name": f"구매 게임 {i} (현재)",
-                            "icon": f"mdi:numeric-{i}-box-outline",
-                        })
-                        await publish_sensor_for_account(account, f"lotto45_game_{i}_result", "구매 내역 없음", {
-                            "round_no": 0,
-                            "my_numbers": [],
-                            "winning_numbers": [],
-                            "bonus_number": 0,
-                            "matching_count": 0,
-                            "bonus_match": False,
-                            "rank": 0,
-                            "result": "구매 내역 없음",
-                            "color": "grey",
-                            "friendly_name": f"구매 게임 {i} (현재) 결과",
-                            "icon": "mdi:circle-outline",
-                        })
+                for i, game_info in enumerate(all_games, 1):
+                    game = game_info["game"]
+                    round_no = game_info["round_no"]
+                    numbers_str = ", ".join(map(str, game.numbers))
+                    pending.append((f"lotto45_game_{i}", numbers_str, _game_attrs(i, "현재", game_info)))
+                    if round_no > latest_round_no:
+                        weekly_purchase_count += 1
+                    # all_games는 current_round(미추첨)만 포함 → 당첨번호 조회 없음 (추첨 결과는 prev_game 센서)
+                    pending.append((f"lotto45_game_{i}_result", game_info["meta"][0], _game_result_attrs(
+                        i, "현재", game_info, [], 0)))
+                for i in range(len(all_games) + 1, 6):
+                    pending.extend(_EMPTY_CURRENT_GAME_PAYLOADS[i - 1])
                 # weekly_purchase_count는 위 루프에서 round_no > latest_round_no일 때 이미 증가됨
 
                 # 이전 회차(추첨 완료) 구매내역: selectMyLotteryledger ltWnResult 직접 사용
                 try:
                     prev_round_no, prev_history = await account.lotto_645.async_get_prev_drawn_round_and_history()
-                    prev_round_games = []
-                    for purchase in prev_history:
-                        for gd in purchase.game_details:
-                            prev_round_games.append({
-                                "game": gd["game"],
-                                "round_no": purchase.round_no,
-                                "result": _rank_drawed_to_result(gd["rank"], gd["drawed"]),
-                            })
-                            if len(prev_round_games) >= 5:
-                                break
-                        if len(prev_round_games) >= 5:
-                            break
-                    await publish_sensor_for_account(account, "lotto45_prev_round", prev_round_no, {
+                    prev_round_games = list(islice(_iter_games(prev_history), 5))
+                    pending.append(("lotto45_prev_round", prev_round_no, {
                         "friendly_name": "구매 회차 (이전)",
                         "icon": "mdi:counter",
-                    })
+                    }))
                     if prev_round_no > 0:
-                        winning_data_prev = await account.lotto_645.async_get_round_info(prev_round_no)
-                        for i in range(1, 6):
-                            if i <= len(prev_round_games):
-                                gp = prev_round_games[i - 1]
-                                g = gp["game"]
-                                rn = gp["round_no"]
-                                ltwn = gp["result"] or "낙첨"
-                                nums_str = ", ".join(map(str, g.numbers))
-                                ri, rc = _ltwn_result_to_icon_color(ltwn)
-                                await publish_sensor_for_account(account, f"lotto45_prev_game_{i}", nums_str, {
-                                    "slot": g.slot, "슬롯": g.slot, "mode": str(g.mode), "선택": str(g.mode),
-                                    "numbers": g.numbers, "round_no": rn, "result": ltwn,
-                                    "friendly_name": f"구매 게임 {i} (이전)", "icon": f"mdi:numeric-{i}-box-multiple",
-                                })
-                                await publish_sensor_for_account(account, f"lotto45_prev_game_{i}_result", ltwn, {
-                                    "round_no": rn, "my_numbers": g.numbers,
-                                    "winning_numbers": winning_data_prev.numbers,
-                                    "bonus_number": winning_data_prev.bonus_num,
-                                    "result": ltwn, "color": rc,
-                                    "friendly_name": f"구매 게임 {i} (이전) 결과", "icon": ri,
-                                })
-                            else:
-                                await publish_sensor_for_account(account, f"lotto45_prev_game_{i}", "구매 내역 없음", {
-                                    "slot": "-", "슬롯": "-", "mode": "-", "선택": "-",
-                                    "numbers": [], "round_no": 0, "result": "-",
-                                    "friendly_name": f"구매 게임 {i} (이전)", "icon": f"mdi:numeric-{i}-box-outline",
-                                })
-                                await publish_sensor_for_account(account, f"lotto45_prev_game_{i}_result", "구매 내역 없음", {
-                                    "round_no": 0, "my_numbers": [], "winning_numbers": [], "bonus_number": 0,
-                                    "matching_count": 0, "bonus_match": False, "rank": 0, "result": "구매 내역 없음", "color": "grey",
-                                    "friendly_name": f"구매 게임 {i} (이전) 결과", "icon": "mdi:circle-outline",
-                                })
+                        if latest_round_info is not None and latest_round_info.round_no == prev_round_no:
+                            winning_data_prev = latest_round_info
+                        else:
+                            winning_data_prev = await account.lotto_645.async_get_round_info(prev_round_no)
+                        for i, gp in enumerate(prev_round_games, 1):
+                            nums_str = ", ".join(map(str, gp["game"].numbers))
+                            pending.append((f"lotto45_prev_game_{i}", nums_str, _game_attrs(i, "이전", gp)))
+                            pending.append((f"lotto45_prev_game_{i}_result", gp["meta"][0], _game_result_attrs(
+                                i, "이전", gp, winning_data_prev.numbers, winning_data_prev.bonus_num)))
+                        for i in range(len(prev_round_games) + 1, 6):
+                            pending.extend(_EMPTY_PREV_GAME_PAYLOADS[i - 1])
                     else:
                         for i in range(1, 6):
-                            await publish_sensor_for_account(account, f"lotto45_prev_game_{i}", "구매 내역 없음", {
-                                "slot": "-", "슬롯": "-", "mode": "-", "선택": "-",
-                                "numbers": [], "round_no": 0, "result": "-",
-                                "friendly_name": f"구매 게임 {i} (이전)", "icon": f"mdi:numeric-{i}-box-outline",
-                            })
-                            await publish_sensor_for_account(account, f"lotto45_prev_game_{i}_result", "구매 내역 없음", {
-                                "round_no": 0, "my_numbers": [], "winning_numbers": [], "bonus_number": 0,
-                                "matching_count": 0, "bonus_match": False, "rank": 0, "result": "구매 내역 없음", "color": "grey",
-                                "friendly_name": f"구매 게임 {i} (이전) 결과", "icon": "mdi:circle-outline",
-                            })
+                            pending.extend(_EMPTY_PREV_GAME_PAYLOADS[i - 1])
                 except Exception as e:
                     logger.warning(f"[SENSOR][{username}] Prev-round sensors failed: {e}")
                 
@@ -1118,60 +1135,69 @@ async def update_sensors_for_account(account: AccountData):
                 weekly_limit = 5
                 remaining_count = max(0, weekly_limit - weekly_purchase_count)
                 
-                await publish_sensor_for_account(account, "lotto45_weekly_purchase_count", weekly_purchase_count, {
+                pending.append(("lotto45_weekly_purchase_count", weekly_purchase_count, {
                     "weekly_limit": weekly_limit,
                     "remaining": remaining_count,
                     "friendly_name": "주간 구매 횟수",
                     "unit_of_measurement": "games",
                     "icon": "mdi:ticket-confirmation" if remaining_count > 0 else "mdi:close-circle",
-                })
+                }))
                 
                 logger.info(f"[SENSOR][{username}] Weekly: {weekly_purchase_count}/{weekly_limit}")
                     
             except Exception as e:
                 logger.warning(f"[SENSOR][{username}] Failed purchase history: {e}")
+            await _flush_sensors(account, pending)
         
         # Hot/Cold Numbers Analysis
         if config["enable_lotto645"] and account.analyzer:
             try:
-                hot_cold_data = await account.analyzer.async_get_hot_cold_numbers(recent_rounds=20)
+                latest_drawn = latest_round_info.round_no if latest_round_info is not None else None
+                if latest_drawn is not None and account.hot_cold_round == latest_drawn:
+                    hot_cold_data = account.hot_cold_data
+                else:
+                    hot_cold_data = await account.analyzer.async_get_hot_cold_numbers(recent_rounds=20)
+                    account.hot_cold_round = latest_drawn
+                    account.hot_cold_data = hot_cold_data
                 
                 # Hot numbers sensor
                 hot_numbers_str = ", ".join(map(str, hot_cold_data.hot_numbers))
-                await publish_sensor_for_account(account, "lotto45_hot_numbers", hot_numbers_str, {
+                pending.append(("lotto45_hot_numbers", hot_numbers_str, {
                     "numbers": hot_cold_data.hot_numbers,
                     "friendly_name": "통계: 가장 많이 나온 번호 10개 (최근 20회)",
                     "icon": "mdi:fire",
-                })
+                }))
                 
                 # Cold numbers sensor
                 cold_numbers_str = ", ".join(map(str, hot_cold_data.cold_numbers))
-                await publish_sensor_for_account(account, "lotto45_cold_numbers", cold_numbers_str, {
+                pending.append(("lotto45_cold_numbers", cold_numbers_str, {
                     "numbers": hot_cold_data.cold_numbers,
                     "friendly_name": "통계: 가장 적게 나온 번호 10개 (최근 20회)",
                     "icon": "mdi:snowflake",
-                })
+                }))
                 
                 # Most frequent numbers sensor
-                top_freq_str = "최근 50회차: " + ", ".join([f"{nf.number}번({nf.count}번 출현)" for nf in hot_cold_data.most_frequent[:5]])
-                await publish_sensor_for_account(account, "lotto45_most_frequent_numbers", top_freq_str, {
+                top_5 = hot_cold_data.most_frequent[:5]
+                top_freq_str = "최근 50회차: " + ", ".join(_FREQ_FMT(nf.number, nf.count) for nf in top_5)
+                pending.append(("lotto45_most_frequent_numbers", top_freq_str, {
                     "top_5": [{"number": nf.number, "count": nf.count, "percentage": nf.percentage} 
-                             for nf in hot_cold_data.most_frequent[:5]],
+                             for nf in top_5],
                     "friendly_name": "통계: 가장 많이 나온 번호 5개 (최근 50회)",
                     "icon": "mdi:chart-bar",
-                })
+                }))
                 
                 logger.info(f"[SENSOR][{username}] Hot/Cold numbers updated")
                 
             except Exception as e:
                 logger.warning(f"[SENSOR][{username}] Failed to update hot/cold numbers: {e}")
+            await _flush_sensors(account, pending)
         
         # Purchase Statistics (Total Winning)
         if config["enable_lotto645"] and account.analyzer:
             try:
                 stats = await account.analyzer.async_get_purchase_statistics(days=365)
                 
-                await publish_sensor_for_account(account, "lotto45_total_winning", stats.total_winning_amount, {
+                pending.append(("lotto45_total_winning", stats.total_winning_amount, {
                     "total_purchase": stats.total_purchase_amount,
                     "total_purchase_count": stats.total_purchase_count,
                     "total_winning_count": stats.total_winning_count,
@@ -1181,91 +1207,35 @@ async def update_sensors_for_account(account: AccountData):
                     "unit_of_measurement": "KRW",
                     "friendly_name": "총 당첨금 (최근 1년)",
                     "icon": "mdi:trophy-variant",
-                })
+                }))
                 
                 logger.info(f"[SENSOR][{username}] Purchase statistics updated (winning: {stats.total_winning_amount} KRW, ROI: {stats.roi}%)")
                 
             except Exception as e:
                 logger.warning(f"[SENSOR][{username}] Failed to update purchase statistics: {e}")
+            await _flush_sensors(account, pending)
         
-        # Winning Probability Sensors
-        if config["enable_lotto645"]:
-            try:
-                # Calculate probabilities (fixed values based on combinatorics)
-                # Total combinations: C(45, 6) = 8,145,060
-                total_combinations = 8145060
-                
-                # 1st prize: 6 numbers match = 1 / 8,145,060
-                prob_1st = (1 / total_combinations) * 100
-                await publish_sensor_for_account(account, "lotto645_probability_rank1", f"{prob_1st:.7f}", {
-                    "probability_decimal": prob_1st,
-                    "probability_fraction": "1/8,145,060",
-                    "unit_of_measurement": "%",
-                    "friendly_name": "로또 1등 당첨 확률",
-                    "icon": "mdi:trophy",
-                })
-                
-                # 2nd prize: 5 numbers + bonus = 6 / 8,145,060
-                prob_2nd = (6 / total_combinations) * 100
-                await publish_sensor_for_account(account, "lotto645_probability_rank2", f"{prob_2nd:.7f}", {
-                    "probability_decimal": prob_2nd,
-                    "probability_fraction": "6/8,145,060",
-                    "unit_of_measurement": "%",
-                    "friendly_name": "로또 2등 당첨 확률",
-                    "icon": "mdi:medal",
-                })
-                
-                # 3rd prize: 5 numbers = 234 / 8,145,060
-                prob_3rd = (234 / total_combinations) * 100
-                await publish_sensor_for_account(account, "lotto645_probability_rank3", f"{prob_3rd:.5f}", {
-                    "probability_decimal": prob_3rd,
-                    "probability_fraction": "234/8,145,060",
-                    "unit_of_measurement": "%",
-                    "friendly_name": "로또 3등 당첨 확률",
-                    "icon": "mdi:medal-outline",
-                })
-                
-                # 4th prize: 4 numbers = 11,115 / 8,145,060
-                prob_4th = (11115 / total_combinations) * 100
-                await publish_sensor_for_account(account, "lotto645_probability_rank4", f"{prob_4th:.4f}", {
-                    "probability_decimal": prob_4th,
-                    "probability_fraction": "11,115/8,145,060",
-                    "unit_of_measurement": "%",
-                    "friendly_name": "로또 4등 당첨 확률",
-                    "icon": "mdi:currency-krw",
-                })
-                
-                # 5th prize: 3 numbers = 185,220 / 8,145,060
-                prob_5th = (185220 / total_combinations) * 100
-                await publish_sensor_for_account(account, "lotto645_probability_rank5", f"{prob_5th:.3f}", {
-                    "probability_decimal": prob_5th,
-                    "probability_fraction": "185,220/8,145,060",
-                    "unit_of_measurement": "%",
-                    "friendly_name": "로또 5등 당첨 확률",
-                    "icon": "mdi:cash",
-                })
-                
-                logger.info(f"[SENSOR][{username}] Winning probabilities updated")
-                
-            except Exception as e:
-                logger.warning(f"[SENSOR][{username}] Failed to update winning probabilities: {e}")
+        # Winning Probability Sensors (고정값: 계정별 최초 1회만 retained 발행)
+        if config["enable_lotto645"] and not account.probabilities_published:
+            account.probabilities_published = await _flush_sensors(account, list(_PROBABILITY_PAYLOADS))
+            if account.probabilities_published:
+                logger.info(f"[SENSOR][{username}] Winning probabilities published")
         
         # Update time
-        now = datetime.now(timezone.utc).isoformat()
-        now_kst = datetime.now(_TZ_KST)
-        await publish_sensor_for_account(account, "lotto45_last_update", now, {
+        pending.append(("lotto45_last_update", utc_iso, {
             "friendly_name": "마지막 업데이트",
             "icon": "mdi:clock-check-outline",
-        })
+        }))
         
         # 동기화 상태 센서 (정상)
-        await publish_sensor_for_account(account, "lotto45_sync_status", "정상 동기화 완료", {
+        pending.append(("lotto45_sync_status", "정상 동기화 완료", {
             "status": "success",
-            "last_sync_time": now_kst.strftime("%Y-%m-%d %H:%M:%S"),
-            "next_sync_in": f"{config['update_interval'] // 60}분 후",
+            "last_sync_time": kst_str,
+            "next_sync_in": retry_in,
             "friendly_name": "동기화 상태",
             "icon": "mdi:check-circle",
-        })
+        }))
+        await _flush_sensors(account, pending)
         
         logger.info(f"[SENSOR][{username}] Updated successfully")
         
@@ -1273,12 +1243,11 @@ async def update_sensors_for_account(account: AccountData):
         if account.client:
             account.client.logged_in = False
         msg = str(e)[:255]
-        now_kst = datetime.now(_TZ_KST)
         
         # 로그인 오류 센서
         await publish_sensor_for_account(account, "lotto45_login_error", msg, {
             "error": str(e),
-            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "timestamp": utc_iso,
             "friendly_name": "로그인 오류",
             "icon": "mdi:account-alert",
         })
@@ -1287,11 +1256,11 @@ async def update_sensors_for_account(account: AccountData):
         await publish_sensor_for_account(account, "lotto45_sync_status", "동기화 실패 (로그인 오류)", {
             "status": "login_error",
             "error": msg,
-            "error_time": now_kst.strftime("%Y-%m-%d %H:%M:%S"),
-            "retry_in": f"{config['update_interval'] // 60}분 후",
+            "error_time": kst_str,
+            "retry_in": retry_in,
             "friendly_name": "동기화 상태",
             "icon": "mdi:alert-circle",
-        })
+        }, qos=1)
         
         logger.warning(f"[SENSOR][{username}] Login/API failed: {e}")
         
@@ -1299,12 +1268,11 @@ async def update_sensors_for_account(account: AccountData):
         if account.client:
             account.client.logged_in = False
         msg = str(e)[:255]
-        now_kst = datetime.now(_TZ_KST)
         
         # API 오류 센서
         await publish_sensor_for_account(account, "lotto45_login_error", msg, {
             "error": str(e),
-            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "timestamp": utc_iso,
             "friendly_name": "로그인/API 오류",
             "icon": "mdi:account-alert",
         })
@@ -1313,73 +1281,154 @@ async def update_sensors_for_account(account: AccountData):
         await publish_sensor_for_account(account, "lotto45_sync_status", "동기화 실패 (API 오류)", {
             "status": "api_error",
             "error": msg,
-            "error_time": now_kst.strftime("%Y-%m-%d %H:%M:%S"),
-            "retry_in": f"{config['update_interval'] // 60}분 후",
+            "error_time": kst_str,
+            "retry_in": retry_in,
             "friendly_name": "동기화 상태",
             "icon": "mdi:alert-circle",
-        })
+        }, qos=1)
         
         logger.warning(f"[SENSOR][{username}] Update failed (API): {e}")
         
     except Exception as e:
         msg = str(e)[:255]
-        now_kst = datetime.now(_TZ_KST)
         
         # 동기화 상태 센서 (알 수 없는 오류)
         await publish_sensor_for_account(account, "lotto45_sync_status", "동기화 실패 (알 수 없는 오류)", {
             "status": "unknown_error",
             "error": msg,
-            "error_time": now_kst.strftime("%Y-%m-%d %H:%M:%S"),
-            "retry_in": f"{config['update_interval'] // 60}분 후",
+            "error_time": kst_str,
+            "retry_in": retry_in,
             "friendly_name": "동기화 상태",
             "icon": "mdi:alert-circle",
-        })
+        }, qos=1)
         
         logger.error(f"[SENSOR][{username}] Update failed: {e}", exc_info=True)
 
 
-async def publish_sensor_for_account(account: AccountData, entity_id: str, state, attributes: dict = None):
-    """Publish sensor"""
+async def _flush_sensors(account: AccountData, pending: List[tuple]) -> bool:
+    """pending에 모아둔 (entity_id, state, attributes) 센서를 한 번에 발행. 모두 MQTT로 발행되면 True."""
+    if not pending:
+        return True
+    
+    results = await asyncio.gather(
+        *(publish_sensor_for_account(account, e, s, a, flush=False) for e, s, a in pending),
+        return_exceptions=True,
+    )
+    published = True
+    for (entity_id, _, _), result in zip(pending, results):
+        if isinstance(result, Exception):
+            logger.error(f"[SENSOR][{account.username}] Publish failed for {entity_id}: {result}")
+        if result is not True:
+            published = False
+    
+    # MQTT로 staging된 상태는 계정별 bulk state 토픽으로 한 번에 발행
+    if mqtt_client and mqtt_client.connected and not mqtt_client.publish_bulk_state(account.username):
+        logger.error(f"[SENSOR][{account.username}] Bulk state publish failed")
+        for entity_id, _, _ in pending:
+            account.last_published.pop(entity_id, None)
+        published = False
+    pending.clear()
+    return published
+
+
+async def get_rest_session():
+    """REST fallback용 공유 ClientSession (Supervisor keep-alive 연결 재사용)"""
+    global _rest_session
+    
+    async with _rest_session_lock:
+        if _rest_session is None or _rest_session.closed:
+            connector = aiohttp.TCPConnector(limit=32, limit_per_host=16, keepalive_timeout=75, ssl=False)
+            _rest_session = aiohttp.ClientSession(
+                connector=connector,
+                headers={
+                    "Authorization": f"Bearer {config['supervisor_token']}",
+                    "Content-Type": "application/json",
+                },
+            )
+    return _rest_session
+
+
+async def close_rest_session():
+    """Close shared REST session"""
+    global _rest_session
+    
+    if _rest_session is not None and not _rest_session.closed:
+        await _rest_session.close()
+    _rest_session = None
+
+
+async def _rest_worker(queue: asyncio.Queue):
+    """REST fallback 큐 소비 워커 (큐 1개당 워커 1개 → 엔티티별 순서 보장)"""
+    while True:
+        username, url, body = await queue.get()
+        try:
+            session = await get_rest_session()
+            async with session.post(url, data=body) as resp:
+                if resp.status not in [200, 201]:
+                    logger.error(f"[SENSOR][{username}] REST failed: {resp.status}")
+        except Exception as e:
+            logger.error(f"[SENSOR][{username}] REST error: {e}")
+        finally:
+            queue.task_done()
+
+
+async def publish_sensor_for_account(account: AccountData, entity_id: str, state, attributes: dict = None,
+                                     qos: Optional[int] = None, flush: bool = True) -> bool:
+    """Publish sensor. 주기적으로 갱신되는 상태는 QoS 0(retain), 오류 상태 등은 qos=1로 호출.
+    flush=False면 MQTT 상태를 staging만 하고 _flush_sensors()에서 계정별로 한 번에 발행.
+    
+    Returns True only when published via MQTT (retained). REST fallback is used only when MQTT
+    is unavailable (queued, returns False); a failed publish on a live connection is retried next cycle.
+    """
     username = account.username
     
     if config["use_mqtt"] and mqtt_client and mqtt_client.connected:
+        await _resync_after_reconnect(account)
+        # 값이 그대로인 센서는 재발행 생략 (retained). 브로커 재시작 대비 주기적으로 강제 발행
+        digest = hash((str(state), orjson.dumps(attributes or {}, option=_DIGEST_JSON_OPTIONS)))
+        now = time.monotonic()
+        last = account.last_published.get(entity_id)
+        if last is not None and last[0] == digest and now - last[1] < _FORCE_REPUBLISH_SECONDS:
+            return True
+        
         try:
             success = await publish_sensor_mqtt(
                 mqtt_client=mqtt_client,
                 entity_id=entity_id,
                 state=state,
                 username=username,
-                attributes=attributes
+                attributes=attributes,
+                qos=qos,
+                flush=flush,
+                # 값은 같지만 강제 재발행 주기가 지남 → 변경 없어도 discovery/bulk state 재발행
+                force=last is not None and last[0] == digest,
             )
             if success:
-                return
+                account.last_published[entity_id] = (digest, now)
+                return True
         except Exception as e:
             logger.error(f"[SENSOR][{username}] MQTT error: {e}")
+        # 연결은 살아있음(discovery 미확인 등) → 상태는 이미 staging됨. REST로 중복 엔티티를 만들지 않고 다음 주기에 재시도
+        if mqtt_client.connected:
+            return False
     
     # REST API fallback
-    import aiohttp
-    
     if not config["supervisor_token"]:
-        return
+        return False
     
     addon_entity_id = f"addon_{username}_{entity_id}"
     url = f"{config['ha_url']}/api/states/sensor.{addon_entity_id}"
-    headers = {
-        "Authorization": f"Bearer {config['supervisor_token']}",
-        "Content-Type": "application/json",
-    }
     data = {
         "state": state,
         "attributes": attributes or {},
     }
     
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, json=data, headers=headers, ssl=False) as resp:
-                if resp.status not in [200, 201]:
-                    logger.error(f"[SENSOR][{username}] REST failed: {resp.status}")
+        body = orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+        _rest_queues[hash(url) % len(_rest_queues)].put_nowait((username, url, body))
     except Exception as e:
         logger.error(f"[SENSOR][{username}] REST error: {e}")
+    return False
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -3,21 +3,59 @@ MQTT Discovery Helper for Home Assistant
 Provides unique_id support for sensors
 """
 
-import json
+import asyncio
 import logging
-import time
+import socket
+import threading
+from collections import OrderedDict
+from functools import lru_cache
 from typing import Optional, Dict, Any
 from urllib.parse import urlparse
+import orjson
 import paho.mqtt.client as mqtt
 
 _LOGGER = logging.getLogger(__name__)
 
 TOPIC_PREFIX = "dhlotto"
 
+# Sensors whose publishes are logged at INFO (keyword in entity_id); the decision is cached per entity_id
+_VERBOSE_ENTITY_KEYWORDS = ("purchase", "latest")
+_verbose_cache: Dict[str, bool] = {}
+
+
+def _is_verbose(entity_id: str) -> bool:
+    """Whether publishes of this sensor are logged at INFO"""
+    verbose = _verbose_cache.get(entity_id)
+    if verbose is None:
+        verbose = _verbose_cache[entity_id] = any(k in entity_id for k in _VERBOSE_ENTITY_KEYWORDS)
+    return verbose
+
+
+def _state_template(sensor_id: str) -> str:
+    """value_template reading one sensor from the bulk payload (keeps the current state if the key is missing)"""
+    return (f"{{% if '{sensor_id}' in value_json %}}{{{{ value_json.{sensor_id}.state }}}}"
+            f"{{% else %}}{{{{ this.state }}}}{{% endif %}}")
+
+
+def _attributes_template(sensor_id: str) -> str:
+    """json_attributes_template reading one sensor from the bulk payload (keeps the current attributes if the key is missing)"""
+    return (f"{{% if '{sensor_id}' in value_json %}}{{{{ value_json.{sensor_id}.attrs | tojson }}}}"
+            f"{{% else %}}{{{{ this.attributes | tojson }}}}{{% endif %}}")
 
 class MQTTDiscovery:
     """MQTT Discovery helper class"""
     
+    # Bound paho's outgoing queue so it cannot grow without limit when the broker stalls (publish rc reports the overflow)
+    max_queued_messages: int = 1000
+    max_inflight_messages: int = 100
+    # Max publishes awaiting a PUBACK via publish_acked() at once (further callers wait for a free slot)
+    max_inflight_acks: int = 20
+    # paho automatic reconnect backoff (seconds)
+    reconnect_min_delay: int = 1
+    reconnect_max_delay: int = 60
+    # Default QoS for sensor state: only the latest retained value matters, so no PUBACK needed (discovery configs stay QoS 1)
+    state_qos: int = 0
+    
     def __init__(self, mqtt_url: str, username: Optional[str] = None, password: Optional[str] = None, client_id_suffix: str = ""):
         """Initialize MQTT Discovery
         
@@ -34,9 +72,75 @@ class MQTTDiscovery:
         self.client: Optional[mqtt.Client] = None
         self.connected = False
         self.connecting = False
+        # Incremented on every successful connect; callers that see a new value republish everything instead of trusting retained state
+        self.generation = 0
+        self._connect_event = threading.Event()  # set by _on_connect on success
+        # (topic, qos) subscriptions: the session is clean, so _on_connect resubscribes after a reconnect
+        self._subscriptions: list = []
+        # mid -> (loop, Future): publish_acked() awaits the PUBACK on the event loop (resolved in _on_publish)
+        self._ack_lock = threading.Lock()
+        self._ack_futures: Dict[int, tuple] = {}
+        # mids acknowledged before their Future was registered (only the latest max_inflight_messages are kept)
+        self._unclaimed_acks: "OrderedDict[int, None]" = OrderedDict()
+        self._inflight = asyncio.Semaphore(self.max_inflight_acks)
         self.topic_prefix = TOPIC_PREFIX + client_id_suffix if client_id_suffix else TOPIC_PREFIX
+        # All accounts share one connection (username only appears in topics); the suffix avoids ID clashes between stable and beta
+        self.client_id = f"dhlottery_addon{client_id_suffix}"
+        # username -> {sensor_id: (JSON bytes, orjson.Fragment)}: per-user {"state", "attrs"} entries published together by publish_bulk_state()
+        # Each sensor is serialized once when staged; the bulk publish only splices the Fragments
+        self._bulk_states: Dict[str, Dict[str, tuple]] = {}
+        self._bulk_dirty: set = set()
+        # (username, sensor_id) whose pre-bulk per-sensor retained state/attributes topics were cleared
+        self._legacy_cleared: set = set()
+        # (username, sensor_id) -> last published discovery settings (name, unit, device_class, icon)
+        self._discovery_published: Dict[tuple, tuple] = {}
+        # Topic/ID/device strings are built once on first use
+        self._sensor_topic_cache: Dict[tuple, tuple] = {}
+        self._bulk_topic_cache: Dict[str, str] = {}
+        self._device_cache: Dict[tuple, orjson.Fragment] = {}
+        self._user_prefix_cache: Dict[str, str] = {}
+    
+    def _user_prefix(self, username: str) -> str:
+        """Return cached 'dhlotto_USERNAME_' prefix shared by unique ids and topics"""
+        prefix = self._user_prefix_cache.get(username)
+        if prefix is None:
+            prefix = self._user_prefix_cache[username] = f"{TOPIC_PREFIX}_{username}_"
+        return prefix
+    
+    def _sensor_topics(self, username: str, sensor_id: str) -> tuple:
+        """Return cached (state, attributes, config, unique_id) for a sensor"""
+        key = (username, sensor_id)
+        topics = self._sensor_topic_cache.get(key)
+        if topics is None:
+            unique_id = self._user_prefix(username) + sensor_id
+            base = "homeassistant/sensor/" + unique_id
+            topics = (f"{base}/state", f"{base}/attributes", f"{base}/config", unique_id)
+            self._sensor_topic_cache[key] = topics
+        return topics
+    
+    def _bulk_state_topic(self, username: str) -> str:
+        """Shared state topic carrying every sensor state of a user as one JSON object"""
+        topic = self._bulk_topic_cache.get(username)
+        if topic is None:
+            topic = self._bulk_topic_cache[username] = f"homeassistant/sensor/{self._user_prefix(username)[:-1]}/state"
+        return topic
+    
+    def _device(self, device_identifier: str, device_name: str) -> orjson.Fragment:
+        """Return cached, pre-serialized device block for discovery configs (spliced by orjson.dumps)"""
+        key = (device_identifier, device_name)
+        device = self._device_cache.get(key)
+        if device is None:
+            device = self._device_cache[key] = orjson.Fragment(orjson.dumps({
+                "identifiers": [device_identifier],
+                "name": device_name,
+                "manufacturer": "우*만",
+                "model": "토스 1000-1261-7813",
+                "sw_version": "커피 한잔은 사랑입니다",
+            }))
+        return device
     
     @staticmethod
+    @lru_cache(maxsize=8)
     def _parse_mqtt_url(mqtt_url: str) -> tuple:
         """Parse MQTT URL
         
@@ -46,6 +150,7 @@ class MQTTDiscovery:
         Returns:
             tuple: (broker, port)
         """
+        # urlparse also handles user:pass@host and IPv6 [::1]:1883, so keep it and cache the result
         # Add mqtt:// prefix if not present
         if not mqtt_url.startswith("mqtt://"):
             mqtt_url = f"mqtt://{mqtt_url}"
@@ -63,23 +168,28 @@ class MQTTDiscovery:
         
         try:
             self.connecting = True
-            self.client = mqtt.Client(client_id="dhlottery_addon", protocol=mqtt.MQTTv311)
+            self._connect_event.clear()
+            self.client = mqtt.Client(client_id=self.client_id, protocol=mqtt.MQTTv311)
+            
+            self.client.max_queued_messages_set(self.max_queued_messages)
+            self.client.max_inflight_messages_set(self.max_inflight_messages)
+            # When the connection drops, the loop thread reconnects with exponential backoff
+            self.client.reconnect_delay_set(min_delay=self.reconnect_min_delay, max_delay=self.reconnect_max_delay)
             
             if self.username_mqtt and self.password_mqtt:
                 self.client.username_pw_set(self.username_mqtt, self.password_mqtt)
             
             self.client.on_connect = self._on_connect
             self.client.on_disconnect = self._on_disconnect
+            self.client.on_socket_open = self._on_socket_open
+            self.client.on_publish = self._on_publish
             
             _LOGGER.info(f"Connecting to MQTT broker: {self.broker}:{self.port}")
             self.client.connect(self.broker, self.port, 60)
             self.client.loop_start()
             
             # Wait for connection (max 5 seconds)
-            timeout = 5
-            start_time = time.time()
-            while not self.connected and (time.time() - start_time) < timeout:
-                time.sleep(0.1)
+            self._connect_event.wait(timeout=5.0)
             
             if not self.connected:
                 _LOGGER.error("MQTT connection timeout")
@@ -100,36 +210,111 @@ class MQTTDiscovery:
             self.client.loop_stop()
             self.client.disconnect()
             self.connected = False
+            self._connect_event.clear()
+    
+    async def publish_acked(self, topic: str, payload, qos: int = 1, retain: bool = True,
+                            timeout: float = 10.0) -> bool:
+        """
+        Publish and await the broker acknowledgement without blocking the event loop
+        
+        The PUBACK is delivered by paho's network thread to _on_publish, which
+        resolves the Future registered here for the message id. _ack_lock is
+        never held across client.publish(): paho calls _on_publish while holding
+        its own message mutex, so nesting the locks the other way deadlocks.
+        """
+        if not self.connected:
+            return False
+        
+        async with self._inflight:
+            result = self.client.publish(topic, payload, qos=qos, retain=retain)
+            if result.rc != mqtt.MQTT_ERR_SUCCESS:
+                return False
+            if qos == 0:
+                return True
+            
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            with self._ack_lock:
+                # The PUBACK was processed between publish() and registration
+                if self._unclaimed_acks.pop(result.mid, False) is None:
+                    return True
+                self._ack_futures[result.mid] = (loop, future)
+            
+            try:
+                return await asyncio.wait_for(future, timeout)
+            except asyncio.TimeoutError:
+                _LOGGER.warning(f"MQTT publish not acknowledged within {timeout}s: {topic}")
+                return False
+            finally:
+                with self._ack_lock:
+                    self._ack_futures.pop(result.mid, None)
+    
+    @staticmethod
+    def _resolve_ack(future: asyncio.Future, acked: bool):
+        if not future.done():
+            future.set_result(acked)
+    
+    def _on_publish(self, client, userdata, mid):
+        """Callback when a publish completed (PUBACK for QoS 1)"""
+        with self._ack_lock:
+            entry = self._ack_futures.pop(mid, None)
+            if entry is None:
+                # Nobody is waiting for this publish, or the Future is not registered yet: record it for publish_acked()
+                self._unclaimed_acks[mid] = None
+                if len(self._unclaimed_acks) > self.max_inflight_messages:
+                    self._unclaimed_acks.popitem(last=False)
+        if entry is not None:
+            loop, future = entry
+            loop.call_soon_threadsafe(self._resolve_ack, future, True)
     
     def _on_connect(self, client, userdata, flags, rc):
         """Callback when connected to MQTT broker"""
         if rc == 0:
+            self.generation += 1
             self.connected = True
+            self._connect_event.set()
             _LOGGER.info("Connected to MQTT broker")
+            # Reconnect: restore subscriptions. Callers republish discovery/state when they see the new generation
+            if self._subscriptions:
+                client.subscribe(self._subscriptions)
+                _LOGGER.info(f"Resubscribed to {len(self._subscriptions)} topic(s)")
         else:
             _LOGGER.error(f"Failed to connect to MQTT broker: {rc}")
     
+    @staticmethod
+    def _on_socket_open(client, userdata, sock):
+        """Disable Nagle so small retained publishes are sent immediately"""
+        try:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except (AttributeError, OSError) as e:
+            _LOGGER.debug(f"TCP_NODELAY not set: {e}")
+    
     def _on_disconnect(self, client, userdata, rc):
         """Callback when disconnected from MQTT broker"""
         self.connected = False
+        # Broker state is unknown after a reconnect, so republish all discovery configs and bulk states
+        self.invalidate_discovery()
+        self._bulk_dirty.update(self._bulk_states)
+        # Fail publishes still waiting for a PUBACK
+        with self._ack_lock:
+            pending = list(self._ack_futures.values())
+            self._ack_futures.clear()
+            self._unclaimed_acks.clear()
+        for loop, future in pending:
+            loop.call_soon_threadsafe(self._resolve_ack, future, False)
         _LOGGER.warning(f"Disconnected from MQTT broker: {rc}")
     
-    def publish_sensor_discovery(
-        self,
-        sensor_id: str,
-        name: str,
-        state_topic: str,
-        username: str,
-        device_name: Optional[str] = None,
-        device_identifier: Optional[str] = None,
-        unit_of_measurement: Optional[str] = None,
-        device_class: Optional[str] = None,
-        icon: Optional[str] = None,
-        value_template: Optional[str] = None,
-        json_attributes_topic: Optional[str] = None,
-    ) -> bool:
+    def invalidate_discovery(self, username: Optional[str] = None):
+        """Forget published sensor discovery configs so they are re-sent (all users if username is None)"""
+        if username is None:
+            self._discovery_published.clear()
+            return
+        for key in [key for key in self._discovery_published if key[0] == username]:
+            del self._discovery_published[key]
+    
+    async def async_publish_sensor_discovery(self, sensor_id: str, *args, **kwargs) -> bool:
         """
-        Publish sensor discovery configuration
+        Publish sensor discovery configuration and await the PUBACK on the event loop
         
         Args:
             sensor_id: Sensor ID (e.g., 'balance', 'hot_numbers')
@@ -143,11 +328,35 @@ class MQTTDiscovery:
             icon: Icon (e.g., 'mdi:wallet')
             value_template: Jinja2 template for value
             json_attributes_topic: Topic for attributes
+            json_attributes_template: Jinja2 template extracting the attributes dict
         """
         if not self.connected:
             _LOGGER.warning("Not connected to MQTT broker")
             return False
         
+        try:
+            discovery_topic, payload = self._sensor_discovery_message(sensor_id, *args, **kwargs)
+            return await self.publish_acked(discovery_topic, payload)
+        except Exception as e:
+            _LOGGER.error(f"Failed to publish discovery for {sensor_id}: {e}")
+            return False
+    
+    def _sensor_discovery_message(
+        self,
+        sensor_id: str,
+        name: str,
+        state_topic: str,
+        username: str,
+        device_name: Optional[str] = None,
+        device_identifier: Optional[str] = None,
+        unit_of_measurement: Optional[str] = None,
+        device_class: Optional[str] = None,
+        icon: Optional[str] = None,
+        value_template: Optional[str] = None,
+        json_attributes_topic: Optional[str] = None,
+        json_attributes_template: Optional[str] = None,
+    ) -> tuple:
+        """Build (discovery_topic, payload) for a sensor discovery configuration"""
         # Use default device if not specified
         if not device_name:
             device_name = f"DH Lottery Addon ({username})"
@@ -155,105 +364,161 @@ class MQTTDiscovery:
             device_identifier = f"{TOPIC_PREFIX}_addon_{username}"
         
         # Discovery topic: homeassistant/sensor/dhlotto_USERNAME_SENSOR_ID/config
-        discovery_topic = f"homeassistant/sensor/{TOPIC_PREFIX}_{username}_{sensor_id}/config"
-        
-        # Unique ID: dhlotto_USERNAME_SENSOR_ID
-        unique_id = f"{TOPIC_PREFIX}_{username}_{sensor_id}"
-        
-        # Entity ID: sensor.dhlotto_USERNAME_SENSOR_ID
-        object_id = f"{TOPIC_PREFIX}_{username}_{sensor_id}"
+        # Unique ID / Entity ID: dhlotto_USERNAME_SENSOR_ID
+        _, _, discovery_topic, unique_id = self._sensor_topics(username, sensor_id)
         
         config = {
             "name": name,
             "unique_id": unique_id,
-            "object_id": object_id,
+            "object_id": unique_id,
             "state_topic": state_topic,
             "has_entity_name": False,  # Prevent device name prefix
-            "device": {
-                "identifiers": [device_identifier],
-                "name": device_name,
-                "manufacturer": "우*만",
-                "model": "토스 1000-1261-7813",
-                "sw_version": "커피 한잔은 사랑입니다",
-            },
+            "device": self._device(device_identifier, device_name),
         }
         
         # Optional fields
-        if unit_of_measurement:
-            config["unit_of_measurement"] = unit_of_measurement
-        if device_class:
-            config["device_class"] = device_class
-        if icon:
-            config["icon"] = icon
-        if value_template:
-            config["value_template"] = value_template
-        if json_attributes_topic:
-            config["json_attributes_topic"] = json_attributes_topic
-        
-        try:
-            payload = json.dumps(config)
-            result = self.client.publish(discovery_topic, payload, qos=1, retain=True)
-            result.wait_for_publish()
-            return True
-        except Exception as e:
-            _LOGGER.error(f"Failed to publish discovery for {sensor_id}: {e}")
-            return False
+        config.update((key, value) for key, value in (
+            ("unit_of_measurement", unit_of_measurement),
+            ("device_class", device_class),
+            ("icon", icon),
+            ("value_template", value_template),
+            ("json_attributes_topic", json_attributes_topic),
+            ("json_attributes_template", json_attributes_template),
+        ) if value)
+        
+        return discovery_topic, orjson.dumps(config)
     
     def publish_sensor_state(self, sensor_id: str, username: str, state: Any, 
-                            attributes: Optional[Dict[str, Any]] = None) -> bool:
+                            attributes: Optional[Dict[str, Any]] = None, qos: Optional[int] = None,
+                            wait: bool = False) -> bool:
         """
         Publish sensor state
         
+        Stages the value into the user's bulk state payload, which is the topic
+        sensor discovery points at, and publishes that payload right away.
+        
         Args:
             sensor_id: Sensor ID
             username: DH Lottery username
             state: Sensor state value
             attributes: Optional attributes dictionary
+            qos: MQTT QoS for the bulk state (default: state_qos)
+            wait: Block until publish completes (default: hand off to paho loop thread)
         """
-        if not self.connected:
-            _LOGGER.warning("Not connected to MQTT broker")
-            return False
-        
-        # State topic
-        state_topic = f"homeassistant/sensor/{TOPIC_PREFIX}_{username}_{sensor_id}/state"
+        self.stage_state(sensor_id, username, state, attributes)
+        return self.publish_bulk_state(username, qos=qos, wait=wait)
+    
+    def restore_bulk_states(self, usernames, timeout: float = 3.0) -> int:
+        """
+        Seed staged states from the retained bulk payloads on the broker
         
+        Call once after connecting, before the first publish_bulk_state(). A
+        fresh process otherwise overwrites the retained payload with only the
+        sensors staged so far (e.g. error sensors or sensors skipped outside
+        sales hours would disappear). Blocks until every payload arrived or
+        timeout. Returns the number of restored sensors.
+        """
+        if not self.connected:
+            return 0
+        
+        remaining = {self._bulk_state_topic(username): username for username in usernames}
+        if not remaining:
+            return 0
+        topics = list(remaining)
+        done = threading.Event()
+        restored = 0
+        
+        def on_bulk_state(client, userdata, message):
+            nonlocal restored
+            username = remaining.pop(message.topic, None)
+            if username is None:
+                return
+            try:
+                payload = orjson.loads(message.payload) if message.payload else {}
+                states = self._bulk_states.setdefault(username, {})
+                for sensor_id, entry in payload.items():
+                    # Values already staged are newer and win
+                    if isinstance(entry, dict) and sensor_id not in states:
+                        entry.setdefault("attrs", {})
+                        encoded = orjson.dumps(entry, option=orjson.OPT_NON_STR_KEYS)
+                        states[sensor_id] = (encoded, orjson.Fragment(encoded))
+                        restored += 1
+            except (ValueError, AttributeError) as e:
+                _LOGGER.warning(f"Ignoring invalid retained bulk state for {username}: {e}")
+            if not remaining:
+                done.set()
+        
+        for topic in topics:
+            self.client.message_callback_add(topic, on_bulk_state)
         try:
-            # Publish state
-            result = self.client.publish(state_topic, str(state), qos=1, retain=True)
-            result.wait_for_publish()
-            
-            # Publish attributes if provided
-            if attributes:
-                attr_topic = f"homeassistant/sensor/{TOPIC_PREFIX}_{username}_{sensor_id}/attributes"
-                attr_payload = json.dumps(attributes)
-                result = self.client.publish(attr_topic, attr_payload, qos=1, retain=True)
-                result.wait_for_publish()
-            
+            self.client.subscribe([(topic, 0) for topic in topics])
+            # Accounts without a retained message (first run) wait until the timeout
+            done.wait(timeout)
+        finally:
+            for topic in topics:
+                self.client.message_callback_remove(topic)
+            self.client.unsubscribe(topics)
+        return restored
+    
+    def clear_legacy_topics(self, sensor_id: str, username: str) -> bool:
+        """Clear the per-sensor retained state/attributes topics used before the bulk state topic (once per sensor)"""
+        key = (username, sensor_id)
+        if key in self._legacy_cleared:
             return True
-        except Exception as e:
-            _LOGGER.error(f"Failed to publish state for {sensor_id}: {e}")
+        if not self.connected:
             return False
+        
+        state_topic, attr_topic, _, _ = self._sensor_topics(username, sensor_id)
+        results = [self.client.publish(topic, b"", qos=1, retain=True) for topic in (state_topic, attr_topic)]
+        if all(result.rc == mqtt.MQTT_ERR_SUCCESS for result in results):
+            self._legacy_cleared.add(key)
+            return True
+        return False
+    
+    def stage_state(self, sensor_id: str, username: str, state: Any,
+                    attributes: Optional[Dict[str, Any]] = None, force: bool = False) -> None:
+        """Stage sensor state/attributes for the next publish_bulk_state() of this user
+        
+        force marks the user dirty even if the value is unchanged (periodic retained refresh).
+        """
+        states = self._bulk_states.setdefault(username, {})
+        # Discovery always declares json_attributes_template, so keep the "attrs" key even when empty
+        entry = {"state": str(state), "attrs": attributes or {}}
+        encoded = orjson.dumps(entry, option=orjson.OPT_NON_STR_KEYS)
+        staged = states.get(sensor_id)
+        if staged is None or staged[0] != encoded:
+            states[sensor_id] = (encoded, orjson.Fragment(encoded))
+            self._bulk_dirty.add(username)
+        elif force:
+            self._bulk_dirty.add(username)
     
-    def remove_sensor(self, sensor_id: str, username: str) -> bool:
+    def publish_bulk_state(self, username: str, qos: Optional[int] = None, wait: bool = False) -> bool:
         """
-        Remove sensor from Home Assistant (publish empty config)
+        Publish all staged states of a user as one retained JSON payload
         
-        Args:
-            sensor_id: Sensor ID
-            username: DH Lottery username
+        Sensors read their own state/attrs via value_template and
+        json_attributes_template, so one PUBLISH replaces two per sensor. The
+        payload always holds every known sensor because the broker keeps only
+        the last retained message.
         """
+        if username not in self._bulk_dirty:
+            return True
         if not self.connected:
+            _LOGGER.warning("Not connected to MQTT broker")
             return False
         
-        discovery_topic = f"homeassistant/sensor/{TOPIC_PREFIX}_{username}_{sensor_id}/config"
-        
         try:
-            result = self.client.publish(discovery_topic, "", qos=1, retain=True)
-            result.wait_for_publish()
-            _LOGGER.info(f"Removed sensor: {sensor_id}")
+            payload = orjson.dumps({sensor_id: staged[1] for sensor_id, staged in self._bulk_states[username].items()})
+            result = self.client.publish(self._bulk_state_topic(username), payload,
+                                         qos=self.state_qos if qos is None else qos, retain=True)
+            if wait:
+                result.wait_for_publish()
+            if result.rc != mqtt.MQTT_ERR_SUCCESS:
+                return False
+            self._bulk_dirty.discard(username)
             return True
         except Exception as e:
-            _LOGGER.error(f"Failed to remove sensor {sensor_id}: {e}")
+            _LOGGER.error(f"Failed to publish bulk state for {username}: {e}")
             return False
     
     def publish_button_discovery(
@@ -266,6 +531,7 @@ class MQTTDiscovery:
         device_identifier: str,
         icon: Optional[str] = None,
         device_class: Optional[str] = None,
+        wait: bool = True,
     ) -> bool:
         """
         Publish button discovery configuration
@@ -279,19 +545,17 @@ class MQTTDiscovery:
             device_identifier: Device identifier (e.g., "dhlotto_lotteuserid_lotto645")
             icon: Icon (e.g., 'mdi:ticket-confirmation')
             device_class: Device class (e.g., 'restart')
+            wait: Block until the broker acknowledges the retained config
         """
         if not self.connected:
             _LOGGER.warning("Not connected to MQTT broker")
             return False
         
-        # Discovery topic: homeassistant/button/dhlotto_USERNAME_BUTTON_ID/config
-        discovery_topic = f"homeassistant/button/{TOPIC_PREFIX}_{username}_{button_id}/config"
-        
-        # Unique ID: dhlotto_USERNAME_BUTTON_ID
-        unique_id = f"{TOPIC_PREFIX}_{username}_{button_id}"
+        # Unique ID / Entity ID: button.dhlotto_USERNAME_BUTTON_ID
+        unique_id = object_id = self._user_prefix(username) + button_id
         
-        # Entity ID: button.dhlotto_USERNAME_BUTTON_ID
-        object_id = f"{TOPIC_PREFIX}_{username}_{button_id}"
+        # Discovery topic: homeassistant/button/dhlotto_USERNAME_BUTTON_ID/config
+        discovery_topic = f"homeassistant/button/{unique_id}/config"
         
         config = {
             "name": name,
@@ -299,13 +563,7 @@ class MQTTDiscovery:
             "object_id": object_id,
             "command_topic": command_topic,
             "has_entity_name": False,  # Prevent device name prefix
-            "device": {
-                "identifiers": [device_identifier],
-                "name": device_name,
-                "manufacturer": "우*만",
-                "model": "토스 1000-1261-7813",
-                "sw_version": "커피 한잔은 사랑입니다",
-            },
+            "device": self._device(device_identifier, device_name),
         }
         
         # Optional fields
@@ -315,51 +573,24 @@ class MQTTDiscovery:
             config["device_class"] = device_class
         
         try:
-            payload = json.dumps(config)
-            _LOGGER.debug(f"Publishing button discovery: {discovery_topic}")
-            _LOGGER.debug(f"Config: {payload}")
+            payload = orjson.dumps(config)
+            if _LOGGER.isEnabledFor(logging.DEBUG):
+                _LOGGER.debug(f"Publishing button discovery: {discovery_topic}")
+                _LOGGER.debug(f"Config: {payload}")
             result = self.client.publish(discovery_topic, payload, qos=1, retain=True)
-            result.wait_for_publish()
+            if wait:
+                result.wait_for_publish()
             _LOGGER.info(f"Published button discovery: button.{object_id}")
-            return True
+            return result.rc == mqtt.MQTT_ERR_SUCCESS
         except Exception as e:
             _LOGGER.error(f"Failed to publish button discovery for {button_id}: {e}")
             return False
     
-    def subscribe_to_commands(self, username: str, callback) -> bool:
-        """
-        Subscribe to button command topics and input text commands
-        
-        Args:
-            username: DH Lottery username
-            callback: Callback function to handle messages
-        """
-        if not self.connected:
-            _LOGGER.warning("Not connected to MQTT broker")
-            return False
-        
-        # Subscribe to all buttons and input text
-        button_ids = ["buy_auto_1", "buy_auto_5", "buy_manual"]
-        
-        try:
-            self.client.on_message = callback
-            
-            # Subscribe to button commands
-            for button_id in button_ids:
-                command_topic = f"homeassistant/button/{TOPIC_PREFIX}_{username}_{button_id}/command"
-                result = self.client.subscribe(command_topic)
-                _LOGGER.info(f"Subscribed to: {command_topic}")
-            
-            # Subscribe to input_text set command
-            input_command_topic = f"homeassistant/text/{TOPIC_PREFIX}_{username}_manual_numbers/set"
-            result = self.client.subscribe(input_command_topic)
-            _LOGGER.info(f"Subscribed to: {input_command_topic}")
-            
-            _LOGGER.info("Waiting for button press and input text events...")
-            return True
-        except Exception as e:
-            _LOGGER.error(f"Failed to subscribe to commands: {e}")
-            return False
+    def subscribe(self, topics: list) -> bool:
+        """Subscribe to (topic, qos) pairs and remember them for automatic reconnects"""
+        self._subscriptions.extend(topic for topic in topics if topic not in self._subscriptions)
+        result, _ = self.client.subscribe(topics)
+        return result == mqtt.MQTT_ERR_SUCCESS
     
     def publish_input_text_discovery(
         self,
@@ -375,6 +606,7 @@ class MQTTDiscovery:
         min_length: int = 0,
         max_length: int = 255,
         pattern: Optional[str] = None,
+        wait: bool = True,
     ) -> bool:
         """
         Publish input_text (text entity) discovery configuration
@@ -392,19 +624,17 @@ class MQTTDiscovery:
             min_length: Minimum length (default: 0)
             max_length: Maximum length (default: 255)
             pattern: Regex pattern for validation
+            wait: Block until the broker acknowledges the retained config
         """
         if not self.connected:
             _LOGGER.warning("Not connected to MQTT broker")
             return False
         
-        # Discovery topic: homeassistant/text/dhlotto_USERNAME_INPUT_ID/config
-        discovery_topic = f"homeassistant/text/{TOPIC_PREFIX}_{username}_{input_id}/config"
-        
-        # Unique ID: dhlotto_USERNAME_INPUT_ID
-        unique_id = f"{TOPIC_PREFIX}_{username}_{input_id}"
+        # Unique ID / Entity ID: text.dhlotto_USERNAME_INPUT_ID
+        unique_id = object_id = self._user_prefix(username) + input_id
         
-        # Entity ID: text.dhlotto_USERNAME_INPUT_ID
-        object_id = f"{TOPIC_PREFIX}_{username}_{input_id}"
+        # Discovery topic: homeassistant/text/dhlotto_USERNAME_INPUT_ID/config
+        discovery_topic = f"homeassistant/text/{unique_id}/config"
         
         config = {
             "name": name,
@@ -416,13 +646,7 @@ class MQTTDiscovery:
             "min": min_length,
             "max": max_length,
             "has_entity_name": False,  # Prevent device name prefix
-            "device": {
-                "identifiers": [device_identifier],
-                "name": device_name,
-                "manufacturer": "우*만",
-                "model": "토스 1000-1261-7813",
-                "sw_version": "커피 한잔은 사랑입니다",
-            },
+            "device": self._device(device_identifier, device_name),
         }
         
         # Optional fields
@@ -432,13 +656,15 @@ class MQTTDiscovery:
             config["pattern"] = pattern
         
         try:
-            payload = json.dumps(config)
-            _LOGGER.debug(f"Publishing input_text discovery: {discovery_topic}")
-            _LOGGER.debug(f"Config: {payload}")
+            payload = orjson.dumps(config)
+            if _LOGGER.isEnabledFor(logging.DEBUG):
+                _LOGGER.debug(f"Publishing input_text discovery: {discovery_topic}")
+                _LOGGER.debug(f"Config: {payload}")
             result = self.client.publish(discovery_topic, payload, qos=1, retain=True)
-            result.wait_for_publish()
+            if wait:
+                result.wait_for_publish()
             _LOGGER.info(f"Published input_text discovery: text.{object_id}")
-            return True
+            return result.rc == mqtt.MQTT_ERR_SUCCESS
         except Exception as e:
             _LOGGER.error(f"Failed to publish input_text discovery for {input_id}: {e}")
             return False
@@ -449,17 +675,31 @@ async def publish_sensor_mqtt(
     entity_id: str,
     state: Any,
     username: str,
-    attributes: Optional[Dict[str, Any]] = None
+    attributes: Optional[Dict[str, Any]] = None,
+    qos: Optional[int] = None,
+    flush: bool = True,
+    verbose: Optional[bool] = None,
+    force: bool = False,
 ) -> bool:
     """
     Helper function to publish sensor via MQTT Discovery
     
+    State and attributes are staged into the user's bulk state payload.
+    
     Args:
         mqtt_client: MQTT Discovery client
         entity_id: Entity ID (e.g., 'lotto45_balance')
         state: Sensor state
         username: DH Lottery username
         attributes: Sensor attributes (includes friendly_name, icon, etc.)
+        qos: QoS for state/attributes (default: mqtt_client.state_qos; discovery config is always QoS 1)
+        flush: Publish the bulk state now; pass False when the caller batches
+            several sensors and calls mqtt_client.publish_bulk_state() itself
+        verbose: Log the publish at INFO (default: purchase/latest sensors only)
+        force: Republish discovery config and bulk state even if unchanged
+    
+    Returns False if the discovery config or the bulk state was not published,
+    so the caller does not treat the sensor as up to date.
     """
     if not mqtt_client or not mqtt_client.connected:
         return False
@@ -470,38 +710,48 @@ async def publish_sensor_mqtt(
     device_class = attributes.get("device_class")
     icon = attributes.get("icon")
     
-    # Prepare state topic
-    state_topic = f"homeassistant/sensor/{TOPIC_PREFIX}_{username}_{entity_id}/state"
-    
-    # Prepare attributes topic
-    json_attributes_topic = None
-    if attributes:
-        json_attributes_topic = f"homeassistant/sensor/{TOPIC_PREFIX}_{username}_{entity_id}/attributes"
+    # State/attributes share the user's bulk state topic
+    bulk_topic = mqtt_client._bulk_state_topic(username)
     
     # Only log important sensors
-    is_important = "purchase" in entity_id or "latest" in entity_id
+    if verbose is None:
+        verbose = _is_verbose(entity_id)
+    is_important = verbose and _LOGGER.isEnabledFor(logging.INFO)
     if is_important:
         _LOGGER.info(f"Publishing MQTT sensor: {entity_id} = {state}")
     
-    # Publish discovery config (only once, but retained)
-    mqtt_client.publish_sensor_discovery(
-        sensor_id=entity_id,
-        name=friendly_name,
-        state_topic=state_topic,
-        username=username,
-        unit_of_measurement=unit,
-        device_class=device_class,
-        icon=icon,
-        json_attributes_topic=json_attributes_topic,
-    )
-    
-    # Publish state
-    result = mqtt_client.publish_sensor_state(
-        sensor_id=entity_id,
-        username=username,
-        state=state,
-        attributes=attributes
-    )
+    # Publish discovery config (retained) only when it changed
+    key = (username, entity_id)
+    signature = (friendly_name, unit, device_class, icon)
+    discovered = True
+    if force or mqtt_client._discovery_published.get(key) != signature:
+        discovered = await mqtt_client.async_publish_sensor_discovery(
+            sensor_id=entity_id,
+            name=friendly_name,
+            state_topic=bulk_topic,
+            username=username,
+            unit_of_measurement=unit,
+            device_class=device_class,
+            icon=icon,
+            value_template=_state_template(entity_id),
+            json_attributes_topic=bulk_topic,
+            json_attributes_template=_attributes_template(entity_id),
+        )
+        if discovered:
+            mqtt_client._discovery_published[key] = signature
+            # Clear the per-sensor retained topics used before the bulk state topic
+            mqtt_client.clear_legacy_topics(entity_id, username)
+    
+    # Stage state/attributes into the bulk payload
+    mqtt_client.stage_state(entity_id, username, state, attributes, force=force)
+    result = True
+    if flush:
+        result = mqtt_client.publish_bulk_state(username, qos=qos)
+    
+    if not discovered:
+        # Report failure so the caller does not record the sensor as published (discovery is retried next update)
+        _LOGGER.warning(f"MQTT discovery not acknowledged: {entity_id}")
+        return False
     
     if is_important and result:
         _LOGGER.info(f"MQTT sensor published: {entity_id}")